@@ -1,6 +1,16 @@
+import argparse
 import pandas as pd
-import requests
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import api_client
+from api_client import BASE_URL, HEADERS
+from id_cache import get_cache
+from log_sinks import open_row_log
+from university_index import UniversityIndex, get_university_by_name
+from workbook_reader import iter_rows, workbook_columns
 
 company_ids = {
     'KC Overseas': 'vC4W-hCnhK',
@@ -10,104 +20,179 @@ company_ids = {
     'Gateway': 'zLg4bAzm5i'
 }
 
-BASE_URL = 'https://dev.api.infigon.app/'
-HEADERS = {
-    'Content-Type': 'application/json',
-    # 'Authorization': 'Bearer YOUR_TOKEN',
-}
+LOG_COLUMNS = ["Row No", "University Name", "Company", "Commission ID", "Status", "Matched Name"]
+
+def resolve_university(name, index=None, fuzzy=False):
+    # Local index first (when prefetched), the by-name endpoint for anything
+    # it doesn't have, then the closest known name before giving up
+    if index is not None:
+        uni_id = index.lookup(name)
+        if uni_id is not None:
+            return {"id": uni_id}
+    uni_info = get_university_by_name(name)
+    if uni_info or index is None or not fuzzy:
+        return uni_info
+    found = index.match(name)
+    if found:
+        uni_id, matched_name, score = found
+        print(f"🔎 '{name}' matched '{matched_name}' (score {score})")
+        return {"id": uni_id, "matchedName": matched_name}
+    return None
 
-def get_university_by_name(name):
+def link_university_to_company(university_id, company_id):
+    # POST the commission link; returns (commission_id, status_text), commission_id "" on failure
+    join_payload = {
+        "universityId": university_id,
+        "companyId": company_id,
+    }
     try:
-        res = requests.get(f"{BASE_URL}/v1/marketplace/study-abroad/universities/by-name/{name}")
+        res = api_client.send_json("POST", f"{BASE_URL}/v1.0/marketplace/commission", "commission_link", join_payload, headers=HEADERS)
         if res.status_code in [200, 201]:
-            # print(res.json())
-            return res.json()
-        else:
-            print(f"⚠️ GET failed for '{name}' → {res.status_code}: {res.text}")
+            result = res.json()
+
+            # Extract Commission ID (new or existing)
+            commission_id = (
+                result.get("existing", {}).get("id") or
+                result.get("id") or
+                "N/A"
+            )
+            return commission_id, "Success (Already Exists)" if "existing" in result else "Success (New Link)"
+        return "", f"Link Failed: {res.status_code} → {res.text}"
     except Exception as e:
-        print(f"[ERROR] Exception in get_university_by_name('{name}'): {e}")
-    return None
+        return "", f"Exception: {str(e)}"
+
+def _split_companies(value):
+    # A company cell may list several: "KC Overseas, GEEBEE"
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return []
+    return [name.strip() for name in re.split(r"[,;\n]", str(value)) if name.strip()]
 
-def map_universities_to_company(excel_file_path, company_name, company_ids_dict):
-    df = pd.read_excel(excel_file_path)
-    if "University" not in df.columns:
-        print("❌ Missing 'University' column.")
-        print(f"🧪 Available columns: {list(df.columns)}")
+def map_universities_to_companies(excel_file_path, company_names, company_ids_dict, index=None, fuzzy=False,
+                                  company_column=None, workers=8, output_file=None):
+    # Links every university in the sheet to every target company in one pass:
+    # company_names for all rows, or the companies named in company_column per row.
+    # Each university is resolved once; the commission POSTs run on `workers` threads.
+    columns = workbook_columns(excel_file_path)
+    wanted = ["University"] + ([company_column] if company_column else [])
+    missing = [column for column in wanted if column not in columns]
+    if missing:
+        print(f"❌ Missing column(s): {', '.join(missing)}")
+        print(f"🧪 Available columns: {columns}")
         return
 
-    company_id = company_ids_dict.get(company_name)
-    if not company_id:
-        print(f"❌ Company '{company_name}' not found in mapping.")
+    unknown = [name for name in company_names if name not in company_ids_dict]
+    for name in unknown:
+        print(f"❌ Company '{name}' not found in mapping.")
+    if unknown and not company_column:
         return
 
-    log_rows = []
-    output_file = f"{os.path.splitext(excel_file_path)[0]}_mapping_log_{company_name.replace(' ', '_')}_.xlsx"
+    if output_file is None:
+        label = company_names[0] if len(company_names) == 1 and not company_column else "combined"
+        output_file = f"{os.path.splitext(excel_file_path)[0]}_mapping_log_{label.replace(' ', '_')}_.xlsx"
 
-    for idx, row in df.iterrows():
+    # Step 1: Collect (university, company) pairs; the first row a pair appears on is kept
+    pairs = {}        # (uni_name, company_name) -> row_number
+    for idx, row in iter_rows(excel_file_path, wanted):
         row_number = idx + 2  # Excel-style row numbering
-        uni_name = str(row['University']).strip()
-
+        uni_name = str(row['University']).strip() if pd.notna(row['University']) else ""
         if not uni_name:
             print(f"⚠️ Row {row_number}: Empty university name. Skipping.")
             continue
+        for company_name in (_split_companies(row.get(company_column)) if company_column else company_names):
+            pairs.setdefault((uni_name, company_name), row_number)
 
-        uni_info = get_university_by_name(uni_name)
-        if not uni_info:
-            print(f"❌ Row {row_number}: University not found: '{uni_name}'")
-            log_rows.append({
-                "Row No": row_number,
-                "University Name": uni_name,
-                "Commission ID": None,
-                "Status": "University Not Found"
-            })
-            continue
+    # Step 2: Resolve each university once
+    universities = {}
+    for (uni_name, _), row_number in pairs.items():
+        if uni_name not in universities:
+            universities[uni_name] = resolve_university(uni_name, index, fuzzy)
+            if not universities[uni_name]:
+                print(f"❌ Row {row_number}: University not found: '{uni_name}'")
+    print(f"🏛️ {len(universities)} universities, {len(pairs)} university/company pairs")
 
-        university_id = uni_info.get("id")
-        join_payload = {
-            "universityId": university_id,
-            "companyId": company_id,
-        }
-
-        try:
-            res = requests.post(f"{BASE_URL}/v1.0/marketplace/commission", json=join_payload, headers=HEADERS)
-            print(res)
-            if res.status_code in [200, 201]:
-                result = res.json()
-
-                # Extract Commission ID (new or existing)
-                commission_id = (
-                    result.get("existing", {}).get("id") or
-                    result.get("id") or
-                    "N/A"
-                )
-
-                status_text = "Success (Already Exists)" if "existing" in result else "Success (New Link)"
-                print(f"✅ Row {row_number}: Linked '{uni_name}' → ID: {commission_id} → {status_text}")
-
-                log_rows.append({
-                    "Row No": row_number,
-                    "University Name": uni_name,
-                    "Commission ID": commission_id,
-                    "Status": status_text
-                })
-            else:
-                print(f"❌ Row {row_number}: Link failed → {res.status_code}: {res.text}")
-                log_rows.append({
+    # Step 3: Link every pair, concurrently. Each (university, company) result
+    # goes to the log as soon as it's known, so an interrupted run keeps what
+    # finished and the log never has to be held in memory.
+    log = open_row_log(output_file, LOG_COLUMNS)
+    in_flight = threading.BoundedSemaphore(max(1, workers) * 4)
+
+    def linked(entry, future):
+        in_flight.release()
+        commission_id, status_text = future.result()
+        entry["Commission ID"] = commission_id
+        entry["Status"] = status_text
+        if commission_id:
+            print(f"✅ Row {entry['Row No']}: Linked '{entry['University Name']}' → {entry['Company']} → ID: {commission_id} → {status_text}")
+        else:
+            print(f"❌ Row {entry['Row No']}: Link to {entry['Company']} failed → {status_text}")
+        log.write(entry)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for (uni_name, company_name), row_number in pairs.items():
+                entry = {
                     "Row No": row_number,
                     "University Name": uni_name,
-                    "Commission ID": "",
-                    "Status": f"Link Failed: {res.status_code} → {res.text}"
-                })
-        except Exception as e:
-            print(f"❌ Row {row_number}: Exception during linking → {e}")
-            log_rows.append({
-                "Row No": row_number,
-                "University Name": uni_name,
-                "Commission ID": "",
-                "Status": f"Exception: {str(e)}"
-            })
-
-    # Save final log
-    pd.DataFrame(log_rows).to_excel(output_file, index=False)
-    print(f"\n📋 Mapping log saved to → {output_file}")
-map_universities_to_company("CombinedUniversities.xlsx", "KC Overseas", company_ids)
+                    "Company": company_name,
+                    "Commission ID": None,
+                    "Status": None,
+                    "Matched Name": None,
+                }
+                uni_info = universities[uni_name]
+                company_id = company_ids_dict.get(company_name)
+                if not uni_info:
+                    entry["Status"] = "University Not Found"
+                elif not company_id:
+                    entry["Status"] = "Company Not Found"
+                else:
+                    entry["Matched Name"] = uni_info.get("matchedName")  # set when only an approximate match was found
+                    in_flight.acquire()
+                    future = pool.submit(link_university_to_company, uni_info.get("id"), company_id)
+                    future.add_done_callback(lambda future, entry=entry: linked(entry, future))
+                    continue
+                log.write(entry)
+    finally:
+        # One log for all companies, one line per (university, company)
+        log.close()
+    print(f"\n📋 Mapping log saved to → {log.path} ({log.count} rows)")
+    return log.path
+
+def map_universities_to_company(excel_file_path, company_name, company_ids_dict, index=None, fuzzy=False):
+    return map_universities_to_companies(excel_file_path, [company_name], company_ids_dict, index, fuzzy, workers=1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Link the universities in a workbook to companies' commissions")
+    parser.add_argument("--file", default="CombinedUniversities.xlsx", help="Workbook with a 'University' column")
+    parser.add_argument("--company", action="append", choices=sorted(company_ids),
+                        help="Company to link every university to; repeat for several (default: KC Overseas)")
+    parser.add_argument("--all-companies", action="store_true", help="Link every university to every company in company_ids")
+    parser.add_argument("--company-column", help="Take each row's companies from this column instead (comma-separated)")
+    parser.add_argument("--log", help="Mapping log path: .xlsx, .csv or .jsonl "
+                                         "(default: <workbook>_mapping_log_<company or combined>_.xlsx)")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("UPLOAD_WORKERS", 8)),
+                        help="Concurrent commission requests")
+    parser.add_argument("--no-prefetch", action="store_true",
+                        help="Look every university up by name instead of prefetching the full university list")
+    parser.add_argument("--fuzzy", action="store_true",
+                        help="Link a name the API doesn't know to the closest known university name "
+                             "(needs the prefetched list; check the 'Matched Name' log column)")
+    args = parser.parse_args(argv)
+
+    # Step 1: Pull the whole university list once and resolve rows locally
+    index = None
+    if not args.no_prefetch:
+        index = UniversityIndex()
+        if not index.load():
+            print("⚠️ University list incomplete; names it doesn't have fall back to the by-name lookup")
+
+    companies = sorted(company_ids) if args.all_companies else (args.company or ["KC Overseas"])
+    map_universities_to_companies(args.file, companies, company_ids, index, fuzzy=args.fuzzy,
+                                  company_column=args.company_column, workers=args.workers, output_file=args.log)
+    if index is not None:
+        index.print_summary()
+    api_client.print_retry_summary()
+    get_cache().print_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import payload_codec
+from metrics import get_metrics
+
+# Shared HTTP layer for the upload scripts: one pooled keep-alive session,
+# per-endpoint timeouts, retry with jittered exponential backoff and an
+# adaptive (AIMD) concurrency limit per endpoint group.
+
+BASE_URL = os.environ.get("UPLOAD_BASE_URL", 'https://dev.api.infigon.app/')
+HEADERS = {
+    'Content-Type': 'application/json',
+    # 'Authorization': 'Bearer YOUR_TOKEN'
+}
+
+POOL_SIZE = int(os.environ.get("UPLOAD_POOL_SIZE", 32))
+MAX_RETRIES = int(os.environ.get("UPLOAD_MAX_RETRIES", 4))
+BACKOFF_BASE = 0.5   # seconds, doubled per attempt
+BACKOFF_MAX = 30.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses that mean the server did not act on the request, so even a
+# non-idempotent POST can be resent safely
+NOT_PROCESSED_STATUSES = {429, 503}
+
+# (connect, read) timeouts in seconds per endpoint
+TIMEOUTS = {
+    "university_by_name": (5, 15),
+    "university_list": (5, 60),
+    "course_list": (5, 60),
+    "university_create": (5, 30),
+    "university_update": (5, 30),
+    "course_check": (5, 15),
+    "course_create": (5, 30),
+    "course_update": (5, 30),
+    "commission_link": (5, 30),
+    # Bulk upserts (batch_sink.BulkTransport) carry up to a batch of records
+    "university_bulk": (5, 120),
+    "course_bulk": (5, 120),
+}
+DEFAULT_TIMEOUT = (5, 30)
+
+# Lookups and PUTs are idempotent; /courses/check is a read-only POST and the
+# commission endpoint returns the existing link instead of duplicating it.
+IDEMPOTENT_ENDPOINTS = {
+    "university_by_name", "university_update", "course_check", "course_update", "commission_link",
+}
+
+# Adaptive concurrency: each endpoint group has its own window that grows by
+# ~1 per window of healthy responses and is cut multiplicatively on 429/503,
+# Retry-After, 5xx / connection errors or a latency spike. Once the window is
+# at its minimum, a Retry-After pauses the whole group (the retried request
+# itself always waits Retry-After). Lookups and writes
+# get separate budgets (maximum windows) so a flood of cheap lookups can't
+# take every pooled connection away from the writes.
+ADAPTIVE = os.environ.get("UPLOAD_ADAPTIVE", "1") != "0"
+LIMIT_INITIAL = int(os.environ.get("UPLOAD_LIMIT_INITIAL", 4))
+BUDGETS = {
+    "lookup": max(1, POOL_SIZE // 2),
+    "write": max(1, POOL_SIZE - POOL_SIZE // 2),
+}
+ENDPOINT_GROUPS = {
+    "university_by_name": "lookup",
+    "university_list": "lookup",
+    "course_list": "lookup",
+    "course_check": "lookup",
+}  # everything else is a write
+OVERLOAD_DECREASE = 0.5   # 429 / 503 / Retry-After
+ERROR_DECREASE = 0.75     # other 5xx, connection errors, latency spikes
+LATENCY_SPIKE_FACTOR = 3.0
+LATENCY_SPIKE_FLOOR = 0.25   # seconds; faster responses never count as a spike
+MIN_DECREASE_INTERVAL = 0.05  # at most one cut per this or one average round trip
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_retries = {}
+_requests = {}
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, pool_block=True, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update(HEADERS)
+                _session = session
+    return _session
+
+
+class AdaptiveLimiter:
+    # AIMD concurrency window for one endpoint group. acquire() blocks while
+    # the group is at its limit or paused by a Retry-After; release() feeds
+    # the response back in.
+
+    def __init__(self, name, maximum, initial=LIMIT_INITIAL, minimum=1):
+        self.name = name
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.inflight = 0
+        self.paused_until = 0.0
+        self.latency_ewma = None
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0 and self.inflight < int(self.limit):
+                    break
+                self._cond.wait(timeout=wait if wait > 0 else None)
+            self.inflight += 1
+
+    def release(self, latency, res=None):
+        # res is None when the request failed without a response
+        status = res.status_code if res is not None else None
+        retry_after = _retry_after(res)
+        with self._cond:
+            self.inflight -= 1
+            now = time.monotonic()
+            spike = (
+                self.latency_ewma is not None and latency > LATENCY_SPIKE_FLOOR
+                and latency > LATENCY_SPIKE_FACTOR * self.latency_ewma
+            )
+            if status in NOT_PROCESSED_STATUSES or retry_after:
+                if retry_after and self.limit <= self.minimum:
+                    # Already down to the minimum window: hold the whole group for Retry-After
+                    self.paused_until = max(self.paused_until, now + retry_after)
+                self._decrease(now, OVERLOAD_DECREASE)
+            elif res is None or status >= 500 or spike:
+                self._decrease(now, ERROR_DECREASE)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            if res is not None and status not in NOT_PROCESSED_STATUSES:
+                # Throttled responses come back instantly; keep them out of the round-trip estimate
+                self.latency_ewma = latency if self.latency_ewma is None else 0.9 * self.latency_ewma + 0.1 * latency
+            self._cond.notify_all()
+
+    def _decrease(self, now, factor):
+        if now - self._last_decrease < max(MIN_DECREASE_INTERVAL, self.latency_ewma or 0):
+            return
+        self.limit = max(self.minimum, self.limit * factor)
+        self._last_decrease = now
+        self.decreases += 1
+
+    def status(self):
+        with self._cond:
+            text = f"{self.name} {int(self.limit)}/{self.maximum} ({self.inflight} in flight"
+            paused = self.paused_until - time.monotonic()
+            if paused > 0:
+                text += f", paused {paused:.1f}s"
+            return text + ")"
+
+
+class _NoLimit:
+    def acquire(self):
+        pass
+
+    def release(self, latency, res=None):
+        pass
+
+
+_limiters = {group: AdaptiveLimiter(group, budget) for group, budget in BUDGETS.items()}
+_no_limit = _NoLimit()
+
+
+def get_limiter(endpoint):
+    if not ADAPTIVE:
+        return _no_limit
+    return _limiters[ENDPOINT_GROUPS.get(endpoint, "write")]
+
+
+def limiter_status():
+    # One-line view of the adaptive limits, for progress output
+    if not ADAPTIVE:
+        return "adaptive limit off"
+    return " · ".join(limiter.status() for limiter in _limiters.values())
+
+
+def _retry_after(res):
+    if res is None:
+        return None
+    value = res.headers.get("Retry-After")
+    if value:
+        try:
+            return min(float(value), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return None
+
+
+def _backoff_delay(attempt, res=None):
+    retry_after = _retry_after(res)
+    if retry_after is not None:
+        return retry_after
+    # Full jitter: uniform in [0, base * 2^attempt]
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _count(table, endpoint):
+    with _stats_lock:
+        table[endpoint] = table.get(endpoint, 0) + 1
+
+
+def request(method, url, endpoint, **kwargs):
+    kwargs.setdefault("timeout", TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+    idempotent = method in ("GET", "PUT", "HEAD", "DELETE") or endpoint in IDEMPOTENT_ENDPOINTS
+    session = get_session()
+    limiter = get_limiter(endpoint)
+
+    attempt = 0
+    while True:
+        _count(_requests, endpoint)
+        res = error = None
+        limiter.acquire()
+        started = time.monotonic()
+        try:
+            res = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        finally:
+            elapsed = time.monotonic() - started
+            limiter.release(elapsed, res)
+            get_metrics().observe_request(endpoint, res.status_code if res is not None else None, elapsed)
+
+        if error is not None:
+            # A connect timeout means nothing was sent; anything else may have reached the server
+            retryable = idempotent or isinstance(error, requests.ConnectTimeout)
+            if not retryable or attempt >= MAX_RETRIES:
+                raise error
+            delay = _backoff_delay(attempt)
+        else:
+            retryable = res.status_code in (RETRY_STATUSES if idempotent else NOT_PROCESSED_STATUSES)
+            if not retryable or attempt >= MAX_RETRIES:
+                return res
+            delay = _backoff_delay(attempt, res)
+
+        _count(_retries, endpoint)
+        attempt += 1
+        time.sleep(delay)
+
+
+_gzip_lock = threading.Lock()
+_gzip = {"mode": payload_codec.GZIP_MODE, "bodies": 0, "raw": 0, "sent": 0}
+
+
+def _disable_gzip(status_code):
+    with _gzip_lock:
+        if _gzip["mode"] != "0":
+            _gzip["mode"] = "0"
+            print(f"⚠️ Server answered {status_code} to a gzip body; sending plain JSON from now on")
+
+
+def send_json(method, url, endpoint, payload, headers=None, **kwargs):
+    # JSON body encoded once (payload_codec), so every retry resends the same
+    # bytes; gzip-compressed when enabled and the body is big enough. In
+    # "auto" mode a 415 / 400 on a gzip body is retried plain once, and if the
+    # plain body fares better gzip is switched off for the rest of the run.
+    body = payload_codec.encode(payload)
+    headers = dict(headers or HEADERS)
+    mode = _gzip["mode"]
+    compressed = payload_codec.compress(body) if mode != "0" else None
+    if compressed is None:
+        return request(method, url, endpoint, data=body, headers=headers, **kwargs)
+
+    with _gzip_lock:
+        _gzip["bodies"] += 1
+        _gzip["raw"] += len(body)
+        _gzip["sent"] += len(compressed)
+    res = request(method, url, endpoint, data=compressed, headers={**headers, "Content-Encoding": "gzip"}, **kwargs)
+    if mode != "auto" or res.status_code not in (400, 415):
+        return res
+    plain = request(method, url, endpoint, data=body, headers=headers, **kwargs)
+    if res.status_code == 415 or plain.status_code != res.status_code:
+        _disable_gzip(res.status_code)
+    return plain
+
+
+def get(url, endpoint, **kwargs):
+    return request("GET", url, endpoint, **kwargs)
+
+
+def post(url, endpoint, **kwargs):
+    return request("POST", url, endpoint, **kwargs)
+
+
+def put(url, endpoint, **kwargs):
+    return request("PUT", url, endpoint, **kwargs)
+
+
+def json_or_empty(res):
+    # Response body as a dict, or {} when it is empty / not a JSON object
+    try:
+        data = res.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+# === Paged list endpoints ===
+#
+# GET url?page=1&limit=N, page after page. A page may be a bare list or an
+# object wrapping it in "data" / "items" / "results" / "universities" /
+# "courses" (any other body raises UnrecognisedPage); paging stops at a
+# short or empty page, or at "totalPages" when the API sends it.
+
+PAGE_SIZE = int(os.environ.get("UPLOAD_PAGE_SIZE", 500))
+MAX_PAGES = 10000  # stop a server that ignores ?page from looping forever
+_PAGE_KEYS = ("data", "items", "results", "universities", "courses")
+
+
+class PageError(Exception):
+    # A page of a list endpoint failed (after retries); status_code is None
+    # when there was no response
+    def __init__(self, page, message, status_code=None):
+        super().__init__(f"page {page}: {message}")
+        self.page = page
+        self.status_code = status_code
+
+
+class UnrecognisedPage(PageError):
+    # A 200 whose body isn't a list in any of the shapes above
+    pass
+
+
+def page_items(body):
+    # (items, total_pages) from one list response; items is None when the
+    # body isn't a recognised list
+    if isinstance(body, list):
+        return body, None
+    if not isinstance(body, dict):
+        return None, None
+    for key in _PAGE_KEYS:
+        value = body.get(key)
+        if isinstance(value, list):
+            return value, body.get("totalPages")
+        if isinstance(value, dict):
+            # {"data": {"items": [...], "totalPages": n}}
+            items, total_pages = page_items(value)
+            if items is not None:
+                return items, total_pages or body.get("totalPages")
+    return None, None
+
+
+def iter_pages(url, endpoint, params=None, page_size=PAGE_SIZE):
+    # Yields each page's list of items; raises PageError if a page fails
+    page = 1
+    while page <= MAX_PAGES:
+        try:
+            res = get(url, endpoint, params={**(params or {}), "page": page, "limit": page_size})
+        except Exception as e:
+            raise PageError(page, e) from e
+        if res.status_code != 200:
+            raise PageError(page, f"{res.status_code}: {res.text}", res.status_code)
+        try:
+            body = res.json()
+        except ValueError:
+            body = None
+        items, total_pages = page_items(body)
+        if items is None:
+            raise UnrecognisedPage(page, f"not a recognised list: {res.text[:200]}", res.status_code)
+        yield items
+        if len(items) < page_size or (total_pages and page >= total_pages):
+            return
+        page += 1
+
+
+def retry_stats():
+    with _stats_lock:
+        return {
+            endpoint: {"requests": count, "retries": _retries.get(endpoint, 0)}
+            for endpoint, count in sorted(_requests.items())
+        }
+
+
+def print_retry_summary():
+    stats = retry_stats()
+    total = sum(s["retries"] for s in stats.values())
+    print(f"\n🔁 Retries used this run: {total}")
+    for endpoint, s in stats.items():
+        print(f"   {endpoint}: {s['requests']} requests, {s['retries']} retries")
+    if _gzip["bodies"]:
+        print(f"🗜️ gzip bodies: {_gzip['bodies']}, {_gzip['raw'] // 1024} KiB → {_gzip['sent'] // 1024} KiB sent")
+    if ADAPTIVE:
+        print(f"🚦 Final limits: {limiter_status()}")
+        print("   " + ", ".join(f"{limiter.name}: {limiter.decreases} cuts" for limiter in _limiters.values()))
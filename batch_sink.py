@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import api_client
+from api_client import BASE_URL, HEADERS
+from metrics import stage
+
+# Client-side batching for university/course upserts with a pluggable
+# transport. Callers submit one upsert at a time and get back an
+# UpsertResult for their own row; the sink groups pending upserts per kind
+# into batches of up to batch_size items (or whatever arrived within
+# max_wait seconds) and hands them to the transport.
+#
+# PerRecordTransport (today's API) has no bulk endpoint, so it is sent
+# inline per record and never waits for a batch. BulkTransport posts a
+# whole batch to a bulk endpoint and maps the per-item results back to
+# the submitting rows.
+
+BATCH_SIZE = int(os.environ.get("UPLOAD_BATCH_SIZE", 50))
+BATCH_WAIT = float(os.environ.get("UPLOAD_BATCH_WAIT", 0.2))   # seconds
+MAX_INFLIGHT_BATCHES = 4
+
+PATHS = {
+    "course": "/v1/marketplace/study-abroad/courses",
+    "university": "/v1/marketplace/study-abroad/universities",
+}
+# Bulk endpoints, for backends that have them:
+#   POST {path}/bulk  {"items": [{"op": "create"|"update", "id": <id or null>, "data": {...}}, ...]}
+#   -> 2xx {"results": [{"status": 201, "id": "...", "error": null}, ...]} in request order
+BULK_SUFFIX = os.environ.get("UPLOAD_BULK_SUFFIX", "/bulk")
+
+
+class UpsertResult:
+    # The bits of a requests.Response the uploaders look at, per item
+    def __init__(self, status_code=None, text="", data=None, error=None, row_number=None):
+        self.status_code = status_code
+        self.text = text
+        self.data = data or {}
+        self.error = error
+        self.row_number = row_number
+
+    def json(self):
+        return self.data
+
+
+class UpsertError(Exception):
+    # Raised by BatchSink.upsert when the record never got a response
+    # (network error, malformed bulk response), like requests would raise
+    pass
+
+
+class UpsertItem:
+    __slots__ = ("kind", "op", "payload", "entity_id", "row_number", "future", "queued_at")
+
+    def __init__(self, kind, op, payload, entity_id=None, row_number=None):
+        self.kind = kind
+        self.op = op
+        self.payload = payload
+        self.entity_id = entity_id
+        self.row_number = row_number
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+
+class PerRecordTransport:
+    batching = False
+
+    def send(self, kind, items):
+        return [self._send_one(kind, item) for item in items]
+
+    def _send_one(self, kind, item):
+        url = f"{BASE_URL}{PATHS[kind]}"
+        try:
+            if item.op == "create":
+                res = api_client.send_json("POST", url, f"{kind}_create", item.payload, headers=HEADERS)
+            else:
+                res = api_client.send_json("PUT", f"{url}/{item.entity_id}", f"{kind}_update", item.payload, headers=HEADERS)
+        except Exception as e:
+            return UpsertResult(error=str(e), row_number=item.row_number)
+        return UpsertResult(res.status_code, res.text, api_client.json_or_empty(res), row_number=item.row_number)
+
+
+class BulkTransport:
+    batching = True
+
+    def send(self, kind, items):
+        body = {"items": [{"op": item.op, "id": item.entity_id, "data": item.payload} for item in items]}
+        try:
+            res = api_client.send_json("POST", f"{BASE_URL}{PATHS[kind]}{BULK_SUFFIX}", f"{kind}_bulk", body, headers=HEADERS)
+        except Exception as e:
+            return [UpsertResult(error=str(e), row_number=item.row_number) for item in items]
+
+        if res.status_code not in [200, 201]:
+            # Whole batch rejected: every row gets the batch's status and body
+            return [UpsertResult(res.status_code, res.text, row_number=item.row_number) for item in items]
+
+        results = api_client.json_or_empty(res).get("results")
+        if not isinstance(results, list) or len(results) != len(items):
+            error = f"bulk response has {len(results) if isinstance(results, list) else 'no'} results for {len(items)} items"
+            return [UpsertResult(res.status_code, res.text, error=error, row_number=item.row_number) for item in items]
+
+        return [
+            UpsertResult(
+                result.get("status"), result.get("error") or "", result,
+                row_number=item.row_number,
+            )
+            for item, result in zip(items, results)
+        ]
+
+
+TRANSPORTS = {
+    "per-record": PerRecordTransport,
+    "bulk": BulkTransport,
+}
+
+
+class BatchSink:
+    def __init__(self, transport, batch_size=BATCH_SIZE, max_wait=BATCH_WAIT):
+        self.transport = transport
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self._pending = {}   # kind -> [UpsertItem]
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flusher = None
+        self._senders = None
+        if transport.batching:
+            self._senders = ThreadPoolExecutor(max_workers=MAX_INFLIGHT_BATCHES)
+            self._flusher = threading.Thread(target=self._flush_loop, name="batch-sink", daemon=True)
+            self._flusher.start()
+
+    def submit(self, kind, op, payload, entity_id=None, row_number=None):
+        item = UpsertItem(kind, op, payload, entity_id, row_number)
+        if not self.transport.batching:
+            item.future.set_result(self.transport.send(kind, [item])[0])
+            return item.future
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BatchSink is closed")
+            self._pending.setdefault(kind, []).append(item)
+            if len(self._pending[kind]) >= self.batch_size:
+                self._cond.notify()
+        return item.future
+
+    def upsert(self, kind, op, payload, entity_id=None, row_number=None):
+        # Blocking single upsert: the row's own result once its batch is sent
+        with stage("upsert"):
+            result = self.submit(kind, op, payload, entity_id, row_number).result()
+        if result.error:
+            raise UpsertError(result.error)
+        return result
+
+    def _next_batch(self):
+        # Called with the lock held: a full batch, or one whose oldest item waited max_wait
+        now = time.monotonic()
+        for kind, items in self._pending.items():
+            if items and (len(items) >= self.batch_size or self._closed or now - items[0].queued_at >= self.max_wait):
+                batch, self._pending[kind] = items[:self.batch_size], items[self.batch_size:]
+                return kind, batch
+        return None
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                next_batch = self._next_batch()
+                while next_batch is None:
+                    if self._closed:
+                        return
+                    self._cond.wait(timeout=self.max_wait / 2 or 0.01)
+                    next_batch = self._next_batch()
+            self._senders.submit(self._send_batch, *next_batch)
+
+    def _send_batch(self, kind, batch):
+        try:
+            results = self.transport.send(kind, batch)
+        except Exception as e:
+            results = [UpsertResult(error=str(e), row_number=item.row_number) for item in batch]
+        for item, result in zip(batch, results):
+            item.future.set_result(result)
+
+    def close(self):
+        # Flush everything still pending, then stop the flusher
+        if not self.transport.batching:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._flusher.join()
+        self._senders.shutdown(wait=True)
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def configure_sink(transport="per-record", batch_size=BATCH_SIZE, max_wait=BATCH_WAIT):
+    global _sink
+    with _sink_lock:
+        _sink = BatchSink(TRANSPORTS[transport](), batch_size=batch_size, max_wait=max_wait)
+    return _sink
+
+
+def get_sink():
+    if _sink is None:
+        configure_sink()
+    return _sink
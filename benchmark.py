@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from mock_api import start_server
+from workbook_reader import iter_rows
+
+# End-to-end throughput benchmark: replays the workbooks through the real
+# upload scripts against a local mock_api server and reports rows/sec,
+# request latency (p50/p99, measured in the mock) and the uploader's peak
+# RSS. Each workbook runs in its own subprocess, on a copy of the workbook in
+# a temp dir, with a fresh mock, ID cache, journal and metrics log, so runs
+# are independent and repeatable and nothing is left in the repo.
+#
+#   python benchmark.py --workers 16 --latency-ms 20
+#   python benchmark.py --save bench_baseline.json
+#   python benchmark.py --baseline bench_baseline.json   # exit 1 on a regression
+#   python benchmark.py Education.xlsx --latency-ms 300 --crash-after 12   # kill -9, then --resume
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# workbook -> uploader that reads it
+WORKBOOKS = {
+    "Education.xlsx": "upload_KC_Courses.py",
+    "CSE.xlsx": "upload_KC_Courses.py",
+    "Commerce.xlsx": "upload_KC_Courses.py",
+    "studyreach_unique_courses_filtered_.xlsx": "upload_script.py",
+}
+
+
+def count_rows(path):
+    return sum(1 for _ in iter_rows(path, columns=[]))
+
+
+def peak_rss_mb(rusage):
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def fetch_json(url, method="GET"):
+    with urllib.request.urlopen(urllib.request.Request(url, method=method)) as res:
+        return json.loads(res.read())
+
+
+def run_uploader(command, workdir, env, crash_after=None):
+    # (exit code, rusage, killed); with crash_after the uploader is sent
+    # SIGKILL that many seconds in, like a container being replaced mid-run
+    with open(os.path.join(workdir, "output.log"), "a") as log:
+        proc = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        killed = False
+        if crash_after is not None:
+            deadline = time.perf_counter() + crash_after
+            while time.perf_counter() < deadline and proc.poll() is None:
+                time.sleep(0.05)
+            if proc.poll() is None:
+                proc.kill()
+                killed = True
+        _, status, rusage = os.wait4(proc.pid, 0)
+    return os.waitstatus_to_exitcode(status), rusage, killed
+
+
+def run_workbook(workbook, script, base_url, workers, extra_args, crash_after=None):
+    rows = count_rows(os.path.join(HERE, workbook))
+    fetch_json(f"{base_url}/__reset?data=1", method="POST")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # The uploader writes its metrics log, dead letters and failure
+        # report next to the workbook, so it runs on a copy in workdir
+        path = shutil.copy(os.path.join(HERE, workbook), workdir)
+        env = dict(os.environ, UPLOAD_BASE_URL=base_url, UPLOAD_CACHE_PATH=os.path.join(workdir, "cache.sqlite"))
+        command = [
+            sys.executable, os.path.join(HERE, script), "--file", path, "--workers", str(workers),
+            "--journal", os.path.join(workdir, "run.journal.jsonl"), *extra_args,
+        ]
+        started = time.perf_counter()
+        killed = False
+        if crash_after is not None:
+            # Kill the first run mid-upload, then finish with --resume; any
+            # create the killed run had in flight must not be sent twice
+            _, first_rusage, killed = run_uploader(command, workdir, env, crash_after)
+            command = [*command, "--resume"]
+        returncode, rusage, _ = run_uploader(command, workdir, env)
+        if crash_after is not None:
+            rusage = max(rusage, first_rusage, key=lambda r: r.ru_maxrss)
+        elapsed = time.perf_counter() - started
+
+        failed_path = os.path.join(workdir, "failed.txt")
+        failed = sum(1 for _ in open(failed_path, encoding="utf-8")) if os.path.exists(failed_path) else None
+        if returncode != 0:
+            with open(os.path.join(workdir, "output.log")) as log:
+                print(log.read()[-2000:])
+
+    stats = fetch_json(f"{base_url}/__stats")
+    return {
+        "workbook": workbook,
+        "exit_code": returncode,
+        "killed": killed,
+        "rows": rows,
+        "failed_rows": failed,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else None,
+        "duplicate_courses": stats["duplicate_courses"],
+        "requests": stats["requests"],
+        "p50_ms": round(stats["p50_ms"], 2) if stats["p50_ms"] is not None else None,
+        "p99_ms": round(stats["p99_ms"], 2) if stats["p99_ms"] is not None else None,
+        "peak_rss_mb": round(peak_rss_mb(rusage), 1),
+        "endpoints": stats["endpoints"],
+    }
+
+
+def print_report(results):
+    print(f"\n{'workbook':<42} {'rows':>7} {'failed':>7} {'dupes':>6} {'secs':>8} {'rows/s':>8} {'reqs':>7} {'p50 ms':>7} {'p99 ms':>7} {'RSS MB':>7}")
+    for r in results:
+        print(
+            f"{r['workbook']:<42} {r['rows']:>7} {str(r['failed_rows']):>7} {r['duplicate_courses']:>6} {r['seconds']:>8} {r['rows_per_sec']:>8} "
+            f"{r['requests']:>7} {str(r['p50_ms']):>7} {str(r['p99_ms']):>7} {r['peak_rss_mb']:>7}"
+        )
+
+
+def check_baseline(results, baseline_path, tolerance):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["workbook"]: r for r in json.load(f)["results"]}
+
+    regressions = []
+    for r in results:
+        before = baseline.get(r["workbook"])
+        if not before:
+            continue
+        if r["rows_per_sec"] < before["rows_per_sec"] * (1 - tolerance):
+            regressions.append(f"{r['workbook']}: {r['rows_per_sec']} rows/s vs baseline {before['rows_per_sec']}")
+        if r["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{r['workbook']}: {r['peak_rss_mb']} MB peak RSS vs baseline {before['peak_rss_mb']}")
+
+    for line in regressions:
+        print(f"❌ Regression: {line}")
+    if not regressions:
+        print(f"✅ Within {tolerance:.0%} of {baseline_path}")
+    return not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the workbooks against mock_api and measure throughput")
+    parser.add_argument("workbooks", nargs="*", default=list(WORKBOOKS), help="Workbooks to replay (default: all four)")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--max-concurrency", type=int, default=0, help="Mock answers 429 beyond this many in-flight requests")
+    parser.add_argument("--crash-after", type=float,
+                        help="SIGKILL each uploader this many seconds in and rerun it with --resume "
+                             "(fails on any duplicate course the restart creates)")
+    parser.add_argument("--save", help="Write the results as JSON (e.g. to use as a baseline)")
+    parser.add_argument("--baseline", help="Compare against a saved run and exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown / RSS growth vs the baseline")
+    # Anything after '--' goes to the uploader, e.g. -- --transport bulk
+    argv = sys.argv[1:]
+    extra_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+
+    server, _ = start_server(
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate, rate_429=args.rate_429, retry_after=args.retry_after,
+        max_concurrency=args.max_concurrency,
+    )
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    print(f"🧪 Mock API on {base_url}: latency {args.latency_ms}ms ±{args.jitter_ms}ms, "
+          f"errors {args.error_rate:.1%}, 429s {args.rate_429:.1%}; {args.workers} workers")
+
+    results = []
+    for workbook in args.workbooks:
+        script = WORKBOOKS.get(workbook, "upload_KC_Courses.py")
+        print(f"⏱️  {workbook} via {script} ...")
+        results.append(run_workbook(workbook, script, base_url, args.workers, extra_args, args.crash_after))
+    server.shutdown()
+
+    print_report(results)
+    ok = all(r["exit_code"] == 0 for r in results)
+    # A course created twice means an update was sent as a create; the mock
+    # inserts it like the real API would, so it has to be caught here
+    for r in results:
+        if args.crash_after is not None and not r["killed"]:
+            print(f"⚠️ {r['workbook']}: finished before --crash-after {args.crash_after}s, nothing was killed")
+        if r["duplicate_courses"]:
+            print(f"❌ {r['workbook']}: {r['duplicate_courses']} duplicate course creates")
+            ok = False
+
+    if args.save:
+        config = {k: v for k, v in vars(args).items() if k not in ("workbooks", "save", "baseline")}
+        config["script_args"] = extra_args
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+        print(f"\n💾 Results saved to {args.save}")
+    if args.baseline:
+        ok = check_baseline(results, args.baseline, args.tolerance) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import hashlib
+import sqlite3
+import threading
+
+from id_cache import CACHE_PATH
+from payload_codec import encode_sorted
+
+# Content-hash manifest of what was last sent for each university / course id.
+# With --skip-unchanged the uploaders compare the cleaned payload's hash
+# against it and skip the PUT when nothing in the spreadsheet changed.
+# Lives in the same SQLite file as the ID cache.
+
+
+def payload_hash(payload):
+    # NaN and None hash the same, as they're sent the same
+    encoded = encode_sorted(payload)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ChangeManifest:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path or ":memory:"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifest ("
+            " kind TEXT NOT NULL, entity_id TEXT NOT NULL, hash TEXT NOT NULL,"
+            " PRIMARY KEY (kind, entity_id))"
+        )
+
+    def is_unchanged(self, kind, entity_id, payload):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash FROM manifest WHERE kind = ? AND entity_id = ?", (kind, str(entity_id))
+            ).fetchone()
+        return row is not None and row[0] == payload_hash(payload)
+
+    def record(self, kind, entity_id, payload):
+        # Call only after the server accepted the payload
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO manifest (kind, entity_id, hash) VALUES (?, ?, ?)",
+                (kind, str(entity_id), payload_hash(payload)),
+            )
+
+    def forget(self, kind, entity_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM manifest WHERE kind = ? AND entity_id = ?", (kind, str(entity_id)))
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_manifest():
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = ChangeManifest()
+    return _manifest
@@ -0,0 +1,117 @@
+import threading
+
+import api_client
+from api_client import BASE_URL
+from id_cache import MISS
+from upload_runner import SingleFlightResolver
+
+# Per-university course index for the uploaders (opt-in, --course-catalog):
+# the first row of a university fetches all of its courses once,
+#
+#   GET /v1/marketplace/study-abroad/courses?universityId=<id>&page=1&limit=500
+#
+# and every row after that decides create vs update from the local
+# (name -> course id) map instead of POSTing /courses/check. Names are
+# compared exactly, as /courses/check does. Courses the run creates are
+# added in place (and a university it creates starts out empty, without a
+# fetch); a course the API says is gone (404 on update) is dropped.
+#
+# A wrong "not listed" answer creates a duplicate course, so the list is
+# only trusted when every item has an id, a name and a universityId equal
+# to the one asked for. Otherwise, or when the endpoint doesn't exist
+# (404 / 405) or answers with something that isn't a recognised list, the
+# catalog switches itself off for the rest of the run and every row falls
+# back to /courses/check. A university whose list fails for another reason
+# answers MISS, so just its rows fall back.
+
+LIST_URL = f"{BASE_URL}/v1/marketplace/study-abroad/courses"
+
+
+class _UniversityCourses:
+    # Always truthy, so SingleFlightResolver keeps a university with no courses
+    def __init__(self, ids=None, ok=True):
+        self.ids = ids or {}
+        self.ok = ok
+
+
+def _listed_for(item, uni_id):
+    # True when a listed course is one of uni_id's, with an id and a name
+    return (isinstance(item, dict) and item.get("id") is not None and isinstance(item.get("name"), str)
+            and item.get("universityId") is not None and str(item["universityId"]) == str(uni_id))
+
+
+class CourseCatalog:
+    def __init__(self, page_size=api_client.PAGE_SIZE):
+        self.page_size = page_size
+        self.disabled = False
+        self._lock = threading.Lock()
+        self._universities = SingleFlightResolver()   # str(uni_id) -> _UniversityCourses
+        self.stats = {"universities": 0, "courses": 0, "pages": 0, "hits": 0, "misses": 0, "fallbacks": 0}
+
+    def _fetch(self, uni_id):
+        ids = {}
+        try:
+            for items in api_client.iter_pages(LIST_URL, "course_list", params={"universityId": uni_id},
+                                               page_size=self.page_size):
+                stray = next((item for item in items if not _listed_for(item, uni_id)), None)
+                if stray is not None:
+                    print(f"⚠️ Course list for university {uni_id} has an item that isn't one of its courses "
+                          f"({str(stray)[:200]}); using /courses/check per row")
+                    self.disabled = True
+                    return _UniversityCourses(ok=False)
+                for item in items:
+                    ids.setdefault(item["name"], item["id"])
+                with self._lock:
+                    self.stats["pages"] += 1
+        except api_client.PageError as e:
+            if isinstance(e, api_client.UnrecognisedPage) or e.status_code in (404, 405):
+                print(f"⚠️ Course list endpoint unusable ({e}); using /courses/check per row")
+                self.disabled = True
+            else:
+                print(f"⚠️ Course list for university {uni_id} failed ({e}); using /courses/check for it")
+            return _UniversityCourses(ok=False)
+        with self._lock:
+            self.stats["universities"] += 1
+            self.stats["courses"] += len(ids)
+        return _UniversityCourses(ids)
+
+    def _courses(self, uni_id):
+        if self.disabled:
+            return None
+        courses = self._universities.resolve(str(uni_id), lambda: self._fetch(uni_id))
+        return courses if courses.ok else None
+
+    def lookup(self, uni_id, name):
+        # Course id, None when the university has no such course, or MISS
+        # when the catalog can't tell (caller falls back to /courses/check)
+        courses = self._courses(uni_id)
+        with self._lock:
+            if courses is None:
+                self.stats["fallbacks"] += 1
+                return MISS
+            course_id = courses.ids.get(name)
+            self.stats["hits" if course_id is not None else "misses"] += 1
+        return course_id
+
+    def add_university(self, uni_id):
+        # A university this run just created has no courses to fetch
+        if uni_id is not None:
+            self._universities.set(str(uni_id), _UniversityCourses())
+
+    def add(self, uni_id, name, course_id):
+        courses = self._universities.get(str(uni_id))
+        if courses is not None and courses.ok and course_id is not None:
+            with self._lock:
+                courses.ids[name] = course_id
+
+    def forget(self, uni_id, name):
+        courses = self._universities.get(str(uni_id))
+        if courses is not None:
+            with self._lock:
+                courses.ids.pop(name, None)
+
+    def print_summary(self):
+        s = self.stats
+        print(f"📚 Course catalog: {s['courses']} courses from {s['universities']} universities ({s['pages']} pages) · "
+              f"{s['hits']} existing, {s['misses']} new, {s['fallbacks']} via /courses/check"
+              + (" (course list unusable, switched off)" if self.disabled else ""))
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+
+from journal import drop_torn_tail
+from payload_codec import sanitize
+
+# Dead letters: one JSON line per failed row with everything needed to send
+# it again without re-reading the workbook,
+#
+#   {"row": 123, "file": "Education.xlsx", "statuses": ["existing", "update_failed_500"],
+#    "endpoint": "course_update", "statusCode": 500, "response": "...",
+#    "university": "...", "universityId": "...", "courseId": "...",
+#    "universityPayload": {...}, "coursePayload": {...}}
+#
+# written next to the journal as <workbook>.deadletter.jsonl, alongside the
+# one-line summaries in failed.txt. replay.py resends them.
+
+DEAD_LETTER_SUFFIX = ".deadletter.jsonl"
+RESPONSE_LIMIT = 4000   # characters of response body kept per entry
+
+
+def dead_letter_path_for(excel_file):
+    return f"{os.path.splitext(excel_file)[0]}{DEAD_LETTER_SUFFIX}"
+
+
+def journal_path_for_dead_letter(path):
+    # Education.shard-0-of-2.deadletter.jsonl -> Education.shard-0-of-2.journal.jsonl
+    stem = path[:-len(DEAD_LETTER_SUFFIX)] if path.endswith(DEAD_LETTER_SUFFIX) else os.path.splitext(path)[0]
+    return f"{stem}.journal.jsonl"
+
+
+def failure_details(endpoint, res=None, error=None):
+    # What a failed request left behind: {endpoint, statusCode, response}
+    text = error if error is not None else getattr(res, "text", None)
+    return {
+        "endpoint": endpoint,
+        "statusCode": getattr(res, "status_code", None),
+        "response": text[:RESPONSE_LIMIT] if isinstance(text, str) else text,
+    }
+
+
+class DeadLetter:
+    # Append-only like the journal; failures are rare, so every line is flushed
+    def __init__(self, path, resume=False, source=None):
+        self.path = path
+        self.source = source
+        self.written = 0
+        self._lock = threading.Lock()
+        if resume:
+            drop_torn_tail(path)
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def record(self, row_number, statuses, university=None, uni_id=None, course_id=None, failure=None,
+               university_payload=None, course_payload=None, message=None):
+        entry = {
+            "row": row_number,
+            "file": self.source,
+            "statuses": list(statuses),
+            **(failure or failure_details(None)),
+            "message": message,
+            "university": university,
+            "universityId": uni_id,
+            "courseId": course_id,
+            "universityPayload": sanitize(university_payload),
+            "coursePayload": sanitize(course_payload),
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.written += 1
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def load_dead_letters(path):
+    # Last entry per row; a torn final line is ignored
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry["row"]] = entry
+    return entries
+
+
+def write_dead_letters(path, entries):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+    os.replace(tmp, path)
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Persistent university/course ID cache shared by all upload scripts, so a
+# rerun over the same workbook skips the by-name and /courses/check lookups.
+#
+# Positive entries (name -> id) live until invalidated; negative entries
+# ("not found") expire after NEGATIVE_TTL seconds. A negative entry only
+# says what a lookup saw: every create deletes it before the request goes
+# out, so a create that fails, times out or is killed in flight leaves no
+# "not found" behind and the next run looks the name up again. ID columns
+# are untyped so ids come back as the same int/str type the API returned.
+
+CACHE_PATH = os.environ.get("UPLOAD_CACHE_PATH", ".upload_id_cache.sqlite")
+NEGATIVE_TTL = int(os.environ.get("UPLOAD_CACHE_NEGATIVE_TTL", 6 * 3600))
+
+MISS = object()  # returned when the cache has no usable entry
+
+
+def normalize_name(name):
+    return " ".join(str(name).split()).casefold()
+
+
+class IdCache:
+    def __init__(self, path=CACHE_PATH, negative_ttl=NEGATIVE_TTL):
+        self.path = path or ":memory:"
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS universities ("
+            " name TEXT PRIMARY KEY, uni_id, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS courses ("
+            " name TEXT NOT NULL, uni_id TEXT NOT NULL, course_id, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (name, uni_id))"
+        )
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+
+    def _lookup(self, sql, params):
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return MISS
+            value, updated_at = row
+            if value is None:
+                if time.time() - updated_at > self.negative_ttl:
+                    self.stats["misses"] += 1
+                    return MISS
+                self.stats["negative_hits"] += 1
+                return None
+            self.stats["hits"] += 1
+            return value
+
+    def _write(self, sql, params):
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    # --- universities (keyed by normalized name) ---
+
+    def get_university(self, name):
+        return self._lookup(
+            "SELECT uni_id, updated_at FROM universities WHERE name = ?", (normalize_name(name),)
+        )
+
+    def put_university(self, name, uni_id):
+        # uni_id=None records a negative ("not found") entry
+        self._write(
+            "INSERT OR REPLACE INTO universities (name, uni_id, updated_at) VALUES (?, ?, ?)",
+            (normalize_name(name), uni_id, time.time()),
+        )
+
+    def invalidate_university(self, name):
+        self._write("DELETE FROM universities WHERE name = ?", (normalize_name(name),))
+
+    # --- courses (keyed by course name + universityId) ---
+
+    def get_course(self, name, uni_id):
+        return self._lookup(
+            "SELECT course_id, updated_at FROM courses WHERE name = ? AND uni_id = ?",
+            (str(name).strip(), str(uni_id)),
+        )
+
+    def put_course(self, name, uni_id, course_id):
+        self._write(
+            "INSERT OR REPLACE INTO courses (name, uni_id, course_id, updated_at) VALUES (?, ?, ?, ?)",
+            (str(name).strip(), str(uni_id), course_id, time.time()),
+        )
+
+    def invalidate_course(self, name, uni_id):
+        self._write(
+            "DELETE FROM courses WHERE name = ? AND uni_id = ?", (str(name).strip(), str(uni_id))
+        )
+
+    def print_summary(self):
+        s = self.stats
+        print(f"🗄️ ID cache ({self.path}): {s['hits']} hits, {s['negative_hits']} negative hits, {s['misses']} misses")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = IdCache()
+    return _cache
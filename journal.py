@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import time
+
+# Append-only JSONL checkpoint journal: one line per finished row with its
+# outcome and resolved ids. Lines are flushed and fsync'ed in batches
+# (every FSYNC_EVERY records or FSYNC_INTERVAL seconds) so the hot loop is
+# not waiting on the disk; a crash loses at most the last unsynced batch,
+# and those rows are simply redone on --resume.
+
+FSYNC_EVERY = 200
+FSYNC_INTERVAL = 1.0
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+
+def journal_path_for(excel_file):
+    return f"{os.path.splitext(excel_file)[0]}.journal.jsonl"
+
+
+def drop_torn_tail(path, chunk=4096):
+    # Cuts a JSONL file back to its last complete line, so a line torn by a
+    # crash isn't glued to the first record appended after it
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            position = start
+        else:
+            keep = 0
+        if keep < end:
+            f.truncate(keep)
+
+
+class Journal:
+    def __init__(self, path, resume=False, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        if resume:
+            drop_torn_tail(path)
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def record(self, row_number, status, university=None, uni_id=None, course_id=None, message=None):
+        line = json.dumps({
+            "row": row_number,
+            "status": status,
+            "university": university,
+            "universityId": uni_id,
+            "courseId": course_id,
+            "message": message,
+        }, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+
+def load_journal(path):
+    # Last recorded outcome per row number; a torn final line from a crash is ignored
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry["row"]] = entry
+    return entries
+
+
+def completed_rows(entries):
+    return {row for row, entry in entries.items() if entry["status"] == STATUS_OK}
+
+
+def resolved_universities(entries):
+    return {
+        str(entry["university"]).strip(): entry["universityId"]
+        for entry in entries.values()
+        if entry.get("university") is not None and entry.get("universityId")
+    }
@@ -0,0 +1,127 @@
+import csv
+import json
+import os
+import re
+import threading
+
+from openpyxl import Workbook
+
+# Output files written row by row as results come in, instead of collected
+# in memory and written at the end: memory stays flat however big the
+# workbook, and an interrupted run leaves everything finished so far on disk.
+#
+#   FailureReport   failed.txt lines, flushed as rows fail and sorted by row
+#                   number on close (so the file reads like it always did)
+#   open_row_log    a table of result rows by extension: .jsonl and .csv are
+#                   appended to directly; .xlsx streams to <path>.partial.jsonl
+#                   and is converted on close with openpyxl's write-only
+#                   workbook (one row in memory at a time). After a crash the
+#                   .partial.jsonl holds the rows that finished.
+
+
+def failure_row_key(line):
+    # "[123] ..." -> 123; lines without a row number sort last, in order
+    match = re.match(r"\[(\d+)\]", line)
+    return int(match.group(1)) if match else float("inf")
+
+
+class FailureReport:
+    def __init__(self, path, sort_key=failure_row_key):
+        self.path = path
+        self.sort_key = sort_key
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8")
+
+    def add(self, message):
+        with self._lock:
+            self._file.write(message + "\n")
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.close()
+        sort_report(self.path, self.sort_key)
+
+
+def sort_report(path, key=failure_row_key):
+    # Rewrites a failure report in row order (failures are few, so they fit in memory)
+    with open(path, encoding="utf-8") as f:
+        lines = [line.rstrip("\n") for line in f if line.strip()]
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for line in sorted(lines, key=key):
+            f.write(line + "\n")
+    os.replace(tmp, path)
+
+
+class JsonlRowLog:
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, row):
+        line = json.dumps({column: row.get(column) for column in self.columns}, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class CsvRowLog(JsonlRowLog):
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+
+    def write(self, row):
+        with self._lock:
+            self._writer.writerow(["" if row.get(column) is None else row.get(column) for column in self.columns])
+            self._file.flush()
+            self.count += 1
+
+
+class ExcelRowLog(JsonlRowLog):
+    def __init__(self, path, columns):
+        super().__init__(f"{path}.partial.jsonl", columns)
+        self.xlsx_path = path
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.close()
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Sheet1")   # what pandas' to_excel called it
+        ws.append(self.columns)
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                ws.append([record.get(column) for column in self.columns])
+        wb.save(self.xlsx_path)
+        os.remove(self.path)
+        self.path = self.xlsx_path
+
+
+def open_row_log(path, columns):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".jsonl":
+        return JsonlRowLog(path, columns)
+    if ext == ".csv":
+        return CsvRowLog(path, columns)
+    return ExcelRowLog(path, columns)
@@ -0,0 +1,221 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Run instrumentation shared by the uploaders:
+#   - per-endpoint request counters by status and latency histograms (fed by api_client)
+#   - per-stage time (read, parse, build, resolve, upsert); nested stages are
+#     exclusive, so "parse" doesn't include the "read" time it pulls through
+#   - a live rows/sec + ETA line
+#   - an optional JSONL event log (one JSON object per line) for tooling.
+#     The log holds a single run: open_log() truncates it, so a rerun or a
+#     --resume replaces the previous run's events instead of appending to them.
+#     The run_start line carries a run id (start time + pid), repeated on run_end.
+#
+# Stage time is summed across worker threads, so with --workers N the
+# resolve/upsert totals are busy time and can exceed the run's wall time.
+
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf")]
+STAGES = ["read", "parse", "build", "resolve", "upsert"]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q):
+        # Upper bound of the bucket holding the q-th request (max for the open bucket)
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return self.max_ms if bound == float("inf") else min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self):
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum_ms / self.total, 2) if self.total else None,
+            "p50_ms": _round(self.percentile(0.50)),
+            "p90_ms": _round(self.percentile(0.90)),
+            "p99_ms": _round(self.percentile(0.99)),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": {
+                ("inf" if bound == float("inf") else str(bound)): count
+                for bound, count in zip(LATENCY_BUCKETS_MS, self.counts)
+            },
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.monotonic()
+        self.statuses = {}     # endpoint -> {status: count}
+        self.latencies = {}    # endpoint -> LatencyHistogram
+        self.stage_seconds = {name: 0.0 for name in STAGES}
+        self.rows_done = 0
+        self.rows_total = None
+        self._log = None
+        self.run_id = None
+
+    # === Event log ===
+
+    def open_log(self, path):
+        self._log = open(path, "w", encoding="utf-8", buffering=1)
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.event("run_start", run_id=self.run_id)
+
+    def event(self, kind, **fields):
+        if self._log is None:
+            return
+        line = json.dumps({"ts": round(time.time(), 3), "event": kind, **fields}, default=str)
+        with self._lock:
+            self._log.write(line + "\n")
+
+    def close(self):
+        if self._log is not None:
+            self.event("run_end", run_id=self.run_id, **self.snapshot())
+            self._log.close()
+            self._log = None
+
+    # === Requests ===
+
+    def observe_request(self, endpoint, status, seconds):
+        # status is None when the request failed without a response
+        status = status if status is not None else "error"
+        with self._lock:
+            counts = self.statuses.setdefault(endpoint, {})
+            counts[status] = counts.get(status, 0) + 1
+            self.latencies.setdefault(endpoint, LatencyHistogram()).add(seconds * 1000)
+
+    # === Stages ===
+
+    @contextmanager
+    def stage(self, name):
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [name, 0.0]   # [stage, time spent in nested stages]
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            with self._lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + elapsed - frame[1]
+
+    def timed_iter(self, iterable, name):
+        # Charge the time spent producing each item to a stage
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    # === Progress ===
+
+    def set_total(self, rows_total):
+        self.rows_total = rows_total
+
+    def add_total(self, rows):
+        # For runs over several workbooks whose sizes arrive one at a time
+        with self._lock:
+            self.rows_total = (self.rows_total or 0) + rows
+
+    def add_stage_time(self, name, seconds):
+        # Stage time measured elsewhere, e.g. in a parse worker process
+        with self._lock:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+
+    def row_done(self, row_number, **fields):
+        with self._lock:
+            self.rows_done += 1
+        self.event("row", row=row_number, **fields)
+
+    def progress_line(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.rows_done / elapsed if elapsed else 0.0
+        line = f"{self.rows_done}"
+        if self.rows_total:
+            line += f"/{self.rows_total}"
+        line += f" rows · {rate:.1f} rows/s"
+        if self.rows_total and rate:
+            remaining = max(0, self.rows_total - self.rows_done) / rate
+            line += f" · ETA {_format_duration(remaining)}"
+        return line
+
+    # === Summary ===
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "elapsed_s": round(time.monotonic() - self.started, 2),
+                "rows_done": self.rows_done,
+                "rows_total": self.rows_total,
+                "stages_s": {name: round(seconds, 3) for name, seconds in self.stage_seconds.items()},
+                "endpoints": {
+                    endpoint: {
+                        "statuses": {str(status): count for status, count in self.statuses[endpoint].items()},
+                        "latency": histogram.snapshot(),
+                    }
+                    for endpoint, histogram in sorted(self.latencies.items())
+                },
+            }
+
+    def print_summary(self):
+        snap = self.snapshot()
+        print(f"\n⏱️  {snap['rows_done']} rows in {_format_duration(snap['elapsed_s'])}")
+        print("   Stage time (summed over workers): " + ", ".join(
+            f"{name} {seconds:.1f}s" for name, seconds in snap["stages_s"].items()
+        ))
+        for endpoint, data in snap["endpoints"].items():
+            latency = data["latency"]
+            statuses = ", ".join(f"{status}×{count}" for status, count in sorted(data["statuses"].items()))
+            print(f"   {endpoint}: {latency['count']} requests [{statuses}] "
+                  f"p50≤{latency['p50_ms']}ms p90≤{latency['p90_ms']}ms p99≤{latency['p99_ms']}ms")
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def metrics_log_path_for(excel_file):
+    return f"{os.path.splitext(excel_file)[0]}.metrics.jsonl"
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def stage(name):
+    return _metrics.stage(name)
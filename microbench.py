@@ -0,0 +1,330 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import payload_codec
+from row_parsers import (
+    MONTH_MAP, SCALAR, extract_exam_scores, normalize_months, parse_duration, parse_fees_and_currency, parse_fields,
+    parse_ranking, parse_single_ranking, parse_work_visa,
+)
+from upload_schemas import KC_COURSES, STUDYREACH_COURSES
+from workbook_reader import iter_rows
+
+# Micro-benchmarks for the row parsers and payload builders, without any
+# HTTP (benchmark.py measures the whole upload end to end). Each case runs
+# one function over a dataset:
+#
+#   kc           the real rows of Education / CSE / Commerce.xlsx
+#   studyreach   the real rows of the StudyReach export
+#   synthetic    --rows generated rows (default 1M) covering both layouts,
+#                drawn from a seeded pool so every run sees the same data
+#
+# and reports rows/sec (best of --repeat timed runs, GC paused) plus, from
+# one traced run over the first --alloc-rows rows, the memory blocks the
+# results keep alive per row and the peak traced bytes per row.
+#
+#   python microbench.py                                  # everything
+#   python microbench.py --only parse_fees --datasets kc  # name filters
+#   python microbench.py --baseline     # compare with microbench_baseline.json, exit 1 on a regression
+#   python microbench.py --save         # refresh microbench_baseline.json
+#
+# --save and --baseline take another path too. The committed baseline was
+# saved with the default options; rerun `python microbench.py --save` after
+# an intended speed-up or slowdown and commit the file with the change.
+# Rows/sec only compares on the machine that saved the baseline (its
+# "machine" config entry); elsewhere only blocks per row are checked, so
+# save a local baseline first to compare speed on your own machine.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DATASET_WORKBOOKS = {
+    "kc": (KC_COURSES, ["Education.xlsx", "CSE.xlsx", "Commerce.xlsx"]),
+    "studyreach": (STUDYREACH_COURSES, ["studyreach_unique_courses_filtered_.xlsx"]),
+}
+BASELINE_PATH = os.path.join(HERE, "microbench_baseline.json")
+SYNTHETIC_POOL = 50000   # distinct generated rows; --rows cycles through them
+
+
+def _cycle(items, rows):
+    return (items * -(-rows // len(items)))[:rows] if items else []
+
+
+class Dataset:
+    def __init__(self, name, pool, rows, schemas):
+        self.name = name
+        self.pool = pool          # distinct records; the dataset is the pool repeated up to `rows`
+        self.rows = rows
+        self.schemas = schemas
+        self._parsed = {}
+
+    def has(self, column):
+        return bool(self.pool) and column in self.pool[0]
+
+    def records(self):
+        return _cycle(self.pool, self.rows)
+
+    def column(self, name, as_text=False):
+        values = [record.get(name, '') for record in self.pool]
+        return _cycle([str(value) for value in values] if as_text else values, self.rows)
+
+    def parsed_rows(self, schema):
+        # Records with row["parsed"] filled in, as the pipeline hands them to the payload builders
+        if schema.name not in self._parsed:
+            parsed = [{**record, "parsed": parse_fields(record, schema.parsed_fields)} for record in self.pool]
+            self._parsed[schema.name] = _cycle(parsed, self.rows)
+        return self._parsed[schema.name]
+
+
+def load_workbooks(name):
+    schema, workbooks = DATASET_WORKBOOKS[name]
+    pool = [record for path in workbooks for _, record in iter_rows(os.path.join(HERE, path), schema.columns)]
+    return Dataset(name, pool, len(pool), [schema])
+
+
+# === Synthetic rows ===
+
+def _synthetic_fee(rng):
+    amount = rng.randrange(3000, 60000, 10)
+    return rng.choice([
+        amount, float(amount) + 0.5, f"AUD {amount}", f"GBP {amount:,}", f"USD {amount:,}.00",
+        f"CAD {amount} per year", f"€{amount}", "", "Varies", None,
+    ])
+
+
+def _synthetic_months(rng):
+    codes = rng.sample(list(MONTH_MAP), rng.randint(1, 4))
+    return rng.choice([",".join(codes), ", ".join(MONTH_MAP[code] for code in codes), codes[0].upper(), None])
+
+
+def _synthetic_ranking_text(rng):
+    lines = [f"{source} Ranking - {rng.choice([rng.randint(1, 2000), 'NA'])}"
+             for source in rng.sample(["Webometrics World", "Webometrics National", "US News", "QS", "THE"], 4)]
+    return rng.choice(["\n".join(lines), lines[0], None])
+
+
+def _synthetic_university(rng, index):
+    return {
+        "University": f"Synthetic University {index}",
+        "University Ranking": _synthetic_ranking_text(rng),
+        "Website URL": rng.choice([f"https://uni{index}.example.edu", None]),
+        "logo": rng.choice([f"https://cdn.example.com/logo/{index}.png", None]),
+        "Campus": rng.choice(["Main Campus", "City", "North", f"Campus {index % 7}"]),
+        "Country": rng.choice(["Australia", "United Kingdom", "Canada", "USA", "Ireland", "Germany"]),
+        "QS  Ranking": rng.choice([rng.randint(1, 1500), f"{rng.randint(5, 12)}01-{rng.randint(5, 12)}50",
+                                   f"={rng.randint(1, 300)}", None]),
+        "The World Ranking": rng.choice([rng.randint(1, 1500), None]),
+    }
+
+
+def synthetic_record(rng, universities):
+    return {
+        **rng.choice(universities),
+        "Program Name": f"{rng.choice(['BSc', 'MSc', 'MBA', 'BA', 'PhD'])} {rng.choice(['Data Science', 'Nursing', 'Law', 'Finance', 'Civil Engineering', 'Education'])} {rng.randint(1, 500)}",
+        "Study Level": rng.choice(["Undergraduate", "Postgraduate", "Diploma", "Doctorate"]),
+        "Duration": rng.choice([f"{rng.choice([12, 18, 24, 36, 48])} Months", f"{rng.randint(1, 4)} Year", "", None]),
+        "Open Intakes": _synthetic_months(rng),
+        "Entry Requirements": rng.choice(["Bachelor's degree with 60%", "Year 12 completion", None]),
+        "IELTS Score": rng.choice([5.5, 6, 6.5, 7, "6.5", "NA", None]),
+        "TOEFL Score": rng.choice([79, 80, 90, 100, "NA", None]),
+        "PTE Score": rng.choice([50, 58, 65, "58", None]),
+        "Yearly Tuition Fees": _synthetic_fee(rng),
+        "Scholarship Detail": rng.choice(["Merit scholarship up to 20%", None]),
+        "Work Visa Permit": rng.choice(["2 years", "18 Months", "52 weeks", "3 Years", "Not available", "", None]),
+    }
+
+
+def synthetic_dataset(rows, seed=0):
+    rng = random.Random(seed)
+    universities = [_synthetic_university(rng, index) for index in range(2000)]
+    pool = [synthetic_record(rng, universities) for _ in range(min(rows, SYNTHETIC_POOL))]
+    return Dataset("synthetic", pool, rows, [KC_COURSES, STUDYREACH_COURSES])
+
+
+# === Cases ===
+# name -> (needs(dataset), setup(dataset) -> inputs, run(inputs) -> results)
+
+def _scalar(column, parse, as_text=False):
+    return (lambda dataset: dataset.has(column),
+            lambda dataset: dataset.column(column, as_text),
+            lambda values: [parse(value) for value in values])
+
+
+def _schema_case(schema, setup, run):
+    return (lambda dataset: schema in dataset.schemas, setup, run)
+
+
+def cases():
+    found = {
+        # parse_fields passes these two the str() of the cell
+        "parse_fees_and_currency": _scalar('Yearly Tuition Fees', parse_fees_and_currency, as_text=True),
+        "parse_duration": _scalar('Duration', parse_duration, as_text=True),
+        "normalize_months": _scalar('Open Intakes', normalize_months),
+        "parse_ranking": _scalar('University Ranking', parse_ranking),
+        "parse_single_ranking": _scalar('QS  Ranking', lambda value: parse_single_ranking("QS", value)),
+        "parse_work_visa": _scalar('Work Visa Permit', parse_work_visa),
+        "extract_exam_scores": (lambda dataset: dataset.has('IELTS Score'),
+                                lambda dataset: dataset.records(),
+                                lambda records: [extract_exam_scores(record) for record in records]),
+    }
+    for schema in (KC_COURSES, STUDYREACH_COURSES):
+        found[f"parse_fields[{schema.name}]"] = _schema_case(
+            schema, lambda dataset: dataset.records(),
+            lambda records, schema=schema: [parse_fields(record, schema.parsed_fields) for record in records])
+        # The same without the per-distinct-value memo, for comparison
+        found[f"parse_fields_per_row[{schema.name}]"] = _schema_case(
+            schema, lambda dataset: dataset.records(),
+            lambda records, schema=schema: [parse_fields(record, schema.parsed_fields, SCALAR) for record in records])
+        found[f"university_payload[{schema.name}]"] = _schema_case(
+            schema, lambda dataset, schema=schema: dataset.parsed_rows(schema),
+            lambda rows, schema=schema: [schema.university_payload(row) for row in rows])
+        found[f"course_payload[{schema.name}]"] = _schema_case(
+            schema, lambda dataset, schema=schema: dataset.parsed_rows(schema),
+            lambda rows, schema=schema: [schema.course_payload(row) for row in rows])
+        found[f"encode_course[{schema.name}]"] = _schema_case(
+            schema, lambda dataset, schema=schema: [schema.course_payload(row) for row in dataset.parsed_rows(schema)],
+            lambda payloads: [payload_codec.encode(payload) for payload in payloads])
+    return found
+
+
+# === Measuring ===
+
+def time_case(run, inputs, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            results = run(inputs)
+            elapsed = time.perf_counter() - started
+        finally:
+            gc.enable()
+        del results
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure_allocations(run, inputs):
+    # Blocks the results keep alive, and peak traced bytes while producing them
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        results = run(inputs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks_before
+    del results
+    return blocks, peak
+
+
+def run_case(dataset, name, setup, run, repeat, alloc_rows):
+    inputs = setup(dataset)
+    rows = len(inputs)
+    seconds = time_case(run, inputs, repeat)
+    sample = inputs[:alloc_rows]
+    blocks, peak = measure_allocations(run, sample)
+    return {
+        "case": f"{dataset.name}/{name}",
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "ops_per_sec": round(rows / seconds, 1) if seconds else None,
+        "us_per_row": round(seconds / rows * 1e6, 3) if rows else None,
+        "blocks_per_row": round(blocks / len(sample), 2) if sample else None,
+        "peak_bytes_per_row": round(peak / len(sample), 1) if sample else None,
+    }
+
+
+def print_report(results):
+    print(f"\n{'case':<52} {'rows':>9} {'ops/s':>12} {'µs/row':>9} {'blocks/row':>11} {'peak B/row':>11}")
+    for r in results:
+        print(f"{r['case']:<52} {r['rows']:>9} {r['ops_per_sec']:>12} {r['us_per_row']:>9} "
+              f"{r['blocks_per_row']:>11} {r['peak_bytes_per_row']:>11}")
+
+
+def check_baseline(results, baseline_path, tolerance):
+    with open(baseline_path, encoding="utf-8") as f:
+        saved = json.load(f)
+    baseline = {r["case"]: r for r in saved["results"]}
+    same_machine = saved["config"].get("machine") == platform.platform()
+    if not same_machine:
+        print(f"⚠️ {baseline_path} was saved on {saved['config'].get('machine')}; comparing blocks/row only")
+
+    regressions = []
+    for r in results:
+        before = baseline.get(r["case"])
+        if not before:
+            continue
+        if before["rows"] != r["rows"]:
+            print(f"⚠️ {r['case']}: {r['rows']} rows vs {before['rows']} in the baseline, not compared")
+            continue
+        if same_machine and r["ops_per_sec"] < before["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{r['case']}: {r['ops_per_sec']} ops/s vs baseline {before['ops_per_sec']}")
+        # Half a block of slack, so a case that keeps ~nothing alive doesn't trip on noise
+        if r["blocks_per_row"] > before["blocks_per_row"] * (1 + tolerance) + 0.5:
+            regressions.append(f"{r['case']}: {r['blocks_per_row']} blocks/row vs baseline {before['blocks_per_row']}")
+
+    for line in regressions:
+        print(f"❌ Regression: {line}")
+    if not regressions:
+        print(f"✅ Within {tolerance:.0%} of {baseline_path}")
+    return not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the row parsers and payload builders")
+    parser.add_argument("--datasets", nargs="+", default=["kc", "studyreach", "synthetic"],
+                        choices=["kc", "studyreach", "synthetic"])
+    parser.add_argument("--only", nargs="+", help="Run only cases whose name contains one of these")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows in the synthetic dataset")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic dataset")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case; the best one counts")
+    parser.add_argument("--alloc-rows", type=int, default=20000, help="Rows traced for the allocation figures")
+    parser.add_argument("--save", nargs="?", const=BASELINE_PATH,
+                        help="Write the results as JSON (default path: microbench_baseline.json)")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE_PATH,
+                        help="Compare against a saved run (default: microbench_baseline.json), exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown / allocation growth vs the baseline")
+    args = parser.parse_args()
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error(f"no baseline at {args.baseline}; create it with --save {args.baseline}")
+
+    all_cases = cases()
+    selected = [name for name in all_cases if not args.only or any(part in name for part in args.only)]
+    results = []
+    for name in args.datasets:
+        started = time.perf_counter()
+        dataset = synthetic_dataset(args.rows, args.seed) if name == "synthetic" else load_workbooks(name)
+        print(f"📦 {name}: {dataset.rows} rows ({len(dataset.pool)} distinct) loaded in {time.perf_counter() - started:.1f}s")
+        for case in selected:
+            needs, setup, run = all_cases[case]
+            if not needs(dataset):
+                continue
+            print(f"⏱️  {name}/{case} ...")
+            results.append(run_case(dataset, case, setup, run, args.repeat, args.alloc_rows))
+        del dataset
+
+    print_report(results)
+    ok = True
+    if args.save:
+        config = {k: v for k, v in vars(args).items() if k not in ("save", "baseline")}
+        config["python"] = platform.python_version()
+        config["machine"] = platform.platform()
+        config["orjson"] = payload_codec.orjson is not None
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+        print(f"\n💾 Results saved to {args.save}")
+    if args.baseline:
+        ok = check_baseline(results, args.baseline, args.tolerance)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
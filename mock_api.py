@@ -0,0 +1,397 @@
+import argparse
+import gzip
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Local stand-in for the marketplace API, so the uploaders can be run and
+# benchmarked without touching dev.api.infigon.app:
+#
+#   python mock_api.py --port 8765 --latency-ms 20 --error-rate 0.01 --rate-429 0.02
+#   UPLOAD_BASE_URL=http://127.0.0.1:8765 python upload_KC_Courses.py --workers 16
+#
+# Serves the endpoints the scripts use (universities list / by-name / POST / PUT,
+# courses list / check / POST / PUT, the bulk upsert endpoints and
+# v1.0/marketplace/commission) from in-memory dicts. Every request gets
+# the configured latency; a fraction get a 429 with Retry-After or a 5xx
+# instead, and with --max-concurrency anything beyond that many requests in
+# flight is answered 429 straight away. GET /__stats returns per-endpoint
+# counts, statuses, latency percentiles and how many course creates
+# duplicated an existing (name, universityId); POST /__reset clears the stats
+# (and the data with ?data=1).
+
+UNIVERSITIES = "/v1/marketplace/study-abroad/universities"
+COURSES = "/v1/marketplace/study-abroad/courses"
+COMMISSION = "/v1.0/marketplace/commission"
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class MockState:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_429=0.0, retry_after=1, max_concurrency=0,
+                 accept_gzip=True):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.max_concurrency = max_concurrency
+        self.accept_gzip = accept_gzip
+        self.inflight = 0
+        self.lock = threading.Lock()
+        self.reset(data=True)
+
+    def reset(self, data=False):
+        with self.lock:
+            if data:
+                self.ids = itertools.count(1)
+                self.universities = {}    # name -> id
+                self.university_ids = set()
+                self.courses = {}         # (name, universityId) -> id
+                self.university_courses = {}  # universityId -> {name: id}
+                self.course_ids = set()
+                self.commissions = {}     # (universityId, companyId) -> id
+                self.duplicate_courses = 0  # creates for a (name, universityId) that already existed
+            self.latencies = {}           # endpoint -> [seconds]
+            self.statuses = {}            # endpoint -> {status: count}
+
+    def record(self, endpoint, status, elapsed):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+            counts = self.statuses.setdefault(endpoint, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            latencies = {endpoint: list(values) for endpoint, values in self.latencies.items()}
+            statuses = {endpoint: dict(counts) for endpoint, counts in self.statuses.items()}
+            duplicate_courses = self.duplicate_courses
+        everything = [value for values in latencies.values() for value in values]
+        endpoints = {
+            endpoint: {
+                "requests": len(values),
+                "statuses": {str(status): count for status, count in sorted(statuses[endpoint].items())},
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+            }
+            for endpoint, values in sorted(latencies.items())
+        }
+        return {
+            "requests": len(everything),
+            "p50_ms": percentile(everything, 0.50) * 1000 if everything else None,
+            "p99_ms": percentile(everything, 0.99) * 1000 if everything else None,
+            "duplicate_courses": duplicate_courses,
+            "endpoints": endpoints,
+        }
+
+    def next_id(self, prefix):
+        return f"{prefix}{next(self.ids)}"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    state = None  # MockState, set by make_server
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        # (body, gzipped, malformed)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        gzipped = self.headers.get("Content-Encoding", "").lower() == "gzip"
+        try:
+            if gzipped and self.state.accept_gzip:
+                raw = gzip.decompress(raw)
+            return (json.loads(raw) if raw else None), gzipped, False
+        except (ValueError, OSError):
+            return None, gzipped, True
+
+    def _handle(self, method):
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        # BASE_URL ends in '/', so the scripts send '//v1/...'
+        path = "/" + "/".join(part for part in url.path.split("/") if part)
+        body, gzipped, malformed = self._read_body()
+
+        if path == "/__stats" and method == "GET":
+            return self._send(200, self.state.stats())
+        if path == "/__reset" and method == "POST":
+            self.state.reset(data="data" in parse_qs(url.query))
+            return self._send(200, {"reset": True})
+
+        state = self.state
+        if gzipped and not state.accept_gzip:
+            endpoint = _endpoint_name(method, path) or "unknown"
+            self._send(415, {"message": "Unsupported Content-Encoding"})
+            return state.record(endpoint, 415, time.perf_counter() - started)
+        if malformed:
+            endpoint = _endpoint_name(method, path) or "unknown"
+            self._send(400, {"message": "Malformed JSON body"})
+            return state.record(endpoint, 400, time.perf_counter() - started)
+        with state.lock:
+            state.inflight += 1
+            overloaded = state.max_concurrency and state.inflight > state.max_concurrency
+        try:
+            if overloaded:
+                # Over capacity: throttle like a real rate limiter would
+                endpoint = _endpoint_name(method, path) or "unknown"
+                status, response, headers = 429, {"message": "Too Many Requests"}, {"Retry-After": str(state.retry_after)}
+            else:
+                endpoint, status, response, headers = self._route(method, path, parse_qs(url.query), body)
+                delay = state.latency + random.uniform(-state.jitter, state.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            with state.lock:
+                state.inflight -= 1
+        self._send(status, response, headers)
+        state.record(endpoint, status, time.perf_counter() - started)
+
+    def _route(self, method, path, query, body):
+        state = self.state
+        endpoint = _endpoint_name(method, path)
+        if endpoint is None:
+            return "unknown", 404, {"message": f"No route for {method} {path}"}, None
+
+        # Fault injection happens before the request is acted on, like a
+        # gateway rejecting it, so a retried POST never creates twice
+        roll = random.random()
+        if roll < state.rate_429:
+            return endpoint, 429, {"message": "Too Many Requests"}, {"Retry-After": str(state.retry_after)}
+        if roll < state.rate_429 + state.error_rate:
+            return endpoint, random.choice([500, 502, 503]), {"message": "Injected failure"}, None
+
+        with state.lock:
+            status, response = ROUTES[endpoint](state, path, query, body or {})
+        return endpoint, status, response, None
+
+
+def _endpoint_name(method, path):
+    if path.startswith(UNIVERSITIES + "/by-name/") and method == "GET":
+        return "university_by_name"
+    if path == UNIVERSITIES and method == "GET":
+        return "university_list"
+    if path == UNIVERSITIES + "/bulk" and method == "POST":
+        return "university_bulk"
+    if path == UNIVERSITIES and method == "POST":
+        return "university_create"
+    if path.startswith(UNIVERSITIES + "/") and method == "PUT":
+        return "university_update"
+    if path == COURSES and method == "GET":
+        return "course_list"
+    if path == COURSES + "/check" and method == "POST":
+        return "course_check"
+    if path == COURSES + "/bulk" and method == "POST":
+        return "course_bulk"
+    if path == COURSES and method == "POST":
+        return "course_create"
+    if path.startswith(COURSES + "/") and method == "PUT":
+        return "course_update"
+    if path == COMMISSION and method == "POST":
+        return "commission_link"
+    return None
+
+
+# Route handlers run under state.lock and return (status, body)
+
+def _university_by_name(state, path, query, body):
+    name = unquote(path[len(UNIVERSITIES + "/by-name/"):])
+    if name in state.universities:
+        return 200, {"id": state.universities[name], "name": name}
+    return 404, {"message": "University not found"}
+
+
+def _university_list(state, path, query, body):
+    page = max(1, int(query.get("page", ["1"])[0]))
+    limit = max(1, int(query.get("limit", ["100"])[0]))
+    names = sorted(state.universities, key=state.universities.get)
+    chunk = names[(page - 1) * limit:page * limit]
+    return 200, {
+        "data": [{"id": state.universities[name], "name": name} for name in chunk],
+        "page": page, "limit": limit, "total": len(names), "totalPages": -(-len(names) // limit),
+    }
+
+
+def _create_university(state, name):
+    if not name:
+        return 400, {"message": "name is required"}
+    if name in state.universities:
+        return 409, {"message": "University already exists", "id": state.universities[name]}
+    uni_id = state.next_id("uni_")
+    state.universities[name] = uni_id
+    state.university_ids.add(uni_id)
+    return 201, {"id": uni_id, "name": name}
+
+
+def _university_create(state, path, query, body):
+    return _create_university(state, body.get("name"))
+
+
+def _university_update(state, path, query, body):
+    uni_id = path.rsplit("/", 1)[1]
+    if uni_id not in state.university_ids:
+        return 404, {"message": "University not found"}
+    return 200, {"id": uni_id}
+
+
+def _course_list(state, path, query, body):
+    university_id = query.get("universityId", [""])[0]
+    page = max(1, int(query.get("page", ["1"])[0]))
+    limit = max(1, int(query.get("limit", ["100"])[0]))
+    if university_id:
+        listed = [(name, university_id, course_id) for name, course_id in state.university_courses.get(university_id, {}).items()]
+    else:
+        listed = [(name, uni_id, course_id) for (name, uni_id), course_id in state.courses.items()]
+    courses = [{"id": course_id, "name": name, "universityId": uni_id} for name, uni_id, course_id in listed]
+    return 200, {
+        "data": courses[(page - 1) * limit:page * limit],
+        "page": page, "limit": limit, "total": len(courses), "totalPages": -(-len(courses) // limit),
+    }
+
+
+def _course_check(state, path, query, body):
+    key = (query.get("name", [""])[0], query.get("universityId", [""])[0])
+    if key in state.courses:
+        return 200, {"id": state.courses[key]}
+    return 404, {"message": "Course not found"}
+
+
+def _create_course(state, body):
+    university_id = body.get("universityId")
+    if university_id not in state.university_ids:
+        return 400, {"message": "Unknown universityId"}
+    # Like the real API this always inserts, so a client that creates a
+    # course it should have updated leaves a duplicate behind. Lookups keep
+    # answering with the first id; the extra ones are only counted.
+    key = (str(body.get("name")), str(university_id))
+    course_id = state.next_id("course_")
+    if key in state.courses:
+        state.duplicate_courses += 1
+    else:
+        state.courses[key] = course_id
+        state.university_courses.setdefault(key[1], {})[key[0]] = course_id
+    state.course_ids.add(course_id)
+    return 201, {"id": course_id}
+
+
+def _course_create(state, path, query, body):
+    return _create_course(state, body)
+
+
+def _course_update(state, path, query, body):
+    course_id = path.rsplit("/", 1)[1]
+    if course_id not in state.course_ids:
+        return 404, {"message": "Course not found"}
+    return 200, {"id": course_id}
+
+
+def _bulk(state, kind, body):
+    # Same contract as batch_sink.BulkTransport: one result per item, in order
+    results = []
+    for item in body.get("items") or []:
+        data = item.get("data") or {}
+        if item.get("op") == "create":
+            status, response = _create_university(state, data.get("name")) if kind == "university" else _create_course(state, data)
+        else:
+            known = state.university_ids if kind == "university" else state.course_ids
+            status, response = (200, {"id": item.get("id")}) if item.get("id") in known else (404, {"message": "Not found"})
+        results.append({"status": status, "id": response.get("id"), "error": None if status < 400 else response.get("message")})
+    return 200, {"results": results}
+
+
+def _commission_link(state, path, query, body):
+    key = (body.get("universityId"), body.get("companyId"))
+    if key in state.commissions:
+        return 200, {"existing": {"id": state.commissions[key]}}
+    state.commissions[key] = state.next_id("commission_")
+    return 201, {"id": state.commissions[key]}
+
+
+ROUTES = {
+    "university_by_name": _university_by_name,
+    "university_list": _university_list,
+    "university_create": _university_create,
+    "university_update": _university_update,
+    "university_bulk": lambda state, path, query, body: _bulk(state, "university", body),
+    "course_list": _course_list,
+    "course_check": _course_check,
+    "course_create": _course_create,
+    "course_update": _course_update,
+    "course_bulk": lambda state, path, query, body: _bulk(state, "course", body),
+    "commission_link": _commission_link,
+}
+
+
+def make_server(host="127.0.0.1", port=8765, **config):
+    state = MockState(**config)
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, state
+
+
+def start_server(host="127.0.0.1", port=0, **config):
+    # Serve from a background thread; port 0 picks a free port (server.server_port)
+    server, state = make_server(host, port, **config)
+    threading.Thread(target=server.serve_forever, name="mock-api", daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the marketplace API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered 500/502/503")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="429 anything beyond this many in-flight requests")
+    parser.add_argument("--reject-gzip", action="store_true", help="Answer 415 to gzip-encoded request bodies")
+    args = parser.parse_args()
+
+    server, _ = make_server(
+        args.host, args.port,
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate, rate_429=args.rate_429, retry_after=args.retry_after,
+        max_concurrency=args.max_concurrency, accept_gzip=not args.reject_gzip,
+    )
+    print(f"🧪 Mock API on http://{args.host}:{server.server_port} (stats: /__stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
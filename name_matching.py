@@ -0,0 +1,158 @@
+import os
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import chain
+
+# Approximate university name matching, for names that differ from the
+# API's only in spelling: "Univ." vs "University", a missing "The",
+# "&" vs "and", accents, punctuation or a typo.
+#
+# Names are reduced to canonical tokens (accents stripped, punctuation
+# dropped, common abbreviations expanded, stop words removed) and scored by
+# Dice similarity of their character trigrams. Word order is kept, and a
+# match also needs the two names to have the same number of tokens, pairing
+# up in order, each equal or, for long words, one typo apart ("Edinbrugh").
+# So "Lincoln University" never matches "University of Lincoln",
+# "Birmingham City University" never matches "University of Birmingham"
+# and "Acadia" never matches "Arcadia".
+#
+# An agent prefix or campus suffix is part of the name: "(ONCAMPUS)
+# Loughborough University" and "Les Roches, Marbella Campus" are separate
+# entities, so "Loughborough University" and "Les Roches" never match them
+# (nor they the bare name).
+#
+# Lookups go through an inverted trigram index. Trigrams that occur in a
+# large share of the names ("uni", "ver", "sit", ...) don't narrow the search,
+# so they're skipped when collecting candidates (but still count in the
+# score), which keeps a query well under a millisecond over tens of
+# thousands of names.
+
+THRESHOLD = float(os.environ.get("UPLOAD_FUZZY_THRESHOLD", 0.8))
+MARGIN = 0.05           # the best id must beat the runner-up id by this much
+CANDIDATES = 25         # candidates scored exactly per query
+TYPO_MIN_LENGTH = 8     # shorter words must match exactly
+COMMON_TRIGRAM_SHARE = 0.02
+
+ABBREVIATIONS = {
+    "univ": "university", "uni": "university", "universiti": "university", "universite": "university",
+    "universitat": "university", "universidad": "university", "universita": "university",
+    "inst": "institute", "institut": "institute", "intl": "international", "int'l": "international",
+    "coll": "college", "tech": "technology", "mgmt": "management", "sch": "school", "sci": "science",
+}
+STOP_WORDS = {"the", "of", "at", "and", "in", "for", "de", "la", "le", "del", "der", "du"}
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def canonical_tokens(name):
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    text = text.replace("&", " and ").replace("'", "")
+    tokens = (ABBREVIATIONS.get(token, token) for token in _NON_WORD.split(text))
+    return [token for token in tokens if token and token not in STOP_WORDS]
+
+
+def canonical_key(name):
+    return " ".join(canonical_tokens(name))
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(a, b):
+    # Dice coefficient of two trigram sets
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def _one_typo_apart(a, b):
+    # One insertion, deletion, substitution or swap of neighbours
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    start = 0
+    while start < len(a) and a[start] == b[start]:
+        start += 1
+    if len(a) < len(b):
+        return a[start:] == b[start + 1:]
+    return (a[start + 1:] == b[start + 1:]
+            or (a[start + 1:start + 2] == b[start:start + 1] and a[start:start + 1] == b[start + 1:start + 2]
+                and a[start + 2:] == b[start + 2:]))
+
+
+def tokens_align(a, b):
+    # Same tokens in the same order: equal, or one typo apart when long
+    a, b = a.split(), b.split()
+    if len(a) != len(b):
+        return False
+    return all(x == y or (min(len(x), len(y)) >= TYPO_MIN_LENGTH and _one_typo_apart(x, y))
+               for x, y in zip(a, b))
+
+
+class FuzzyNameIndex:
+    def __init__(self, threshold=THRESHOLD, margin=MARGIN):
+        self.threshold = threshold
+        self.margin = margin
+        self._entries = []                # (key, trigram set, value, name)
+        self._exact = defaultdict(set)    # canonical key -> entry positions
+        self._postings = defaultdict(list)
+        self._seen = set()
+        self.stats = {"queries": 0, "matches": 0, "seconds": 0.0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, name, value):
+        key = canonical_key(name)
+        if not key or (key, value) in self._seen:
+            return
+        self._seen.add((key, value))
+        position = len(self._entries)
+        grams = trigrams(key)
+        self._entries.append((key, grams, value, name))
+        self._exact[key].add(position)
+        for gram in grams:
+            self._postings[gram].append(position)
+
+    def _candidates(self, grams):
+        common = max(64, int(len(self._entries) * COMMON_TRIGRAM_SHARE))
+        postings = [self._postings[gram] for gram in grams if gram in self._postings]
+        rare = [positions for positions in postings if len(positions) <= common]
+        # Nothing but common trigrams: fall back to all of them
+        shared = Counter(chain.from_iterable(rare or postings))
+        return [position for position, _ in shared.most_common(CANDIDATES)]
+
+    def match(self, name):
+        # (value, matched name, score) for a confident match, else None
+        started = time.perf_counter()
+        self.stats["queries"] += 1
+        best = {}   # value -> (score, name)
+        key = canonical_key(name)
+        grams = trigrams(key)
+        exact = self._exact.get(key, ())
+        for position in exact or self._candidates(grams):
+            entry_key, entry_grams, value, entry_name = self._entries[position]
+            if position in exact:
+                score = 1.0
+            else:
+                score = similarity(grams, entry_grams)
+                if score < self.threshold or not tokens_align(key, entry_key):
+                    continue
+            if score > best.get(value, (0.0,))[0]:
+                best[value] = (score, entry_name)
+        self.stats["seconds"] += time.perf_counter() - started
+
+        ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)
+        if not ranked or ranked[0][1][0] < self.threshold:
+            return None
+        if len(ranked) > 1 and ranked[1][1][0] > ranked[0][1][0] - self.margin:
+            return None  # two different universities score about the same
+        value, (score, matched_name) = ranked[0]
+        self.stats["matches"] += 1
+        return value, matched_name, round(score, 3)
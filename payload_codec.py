@@ -0,0 +1,91 @@
+import datetime
+import gzip
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder does the same, a bit slower
+    orjson = None
+
+# Request bodies: a payload dict goes to JSON bytes in one step, with NaN /
+# inf / pandas NA / NaT turned into null on the way, so the payload builders
+# no longer clean every dict first and requests doesn't serialize it again.
+# api_client encodes each body once and resends the same bytes on retries.
+#
+# With orjson installed it does the whole thing natively (NaN -> null is
+# its default). The stdlib path encodes strictly and, only for the payloads
+# that actually hold a NaN somewhere, makes a cleaned copy and encodes that;
+# the payload itself is never modified.
+#
+# Bodies of GZIP_MIN_BYTES or more can be sent gzip-compressed
+# (UPLOAD_GZIP=1, or "auto" to try it and fall back for good on the first
+# 415 / 400 the plain body doesn't also get; see api_client.send_json).
+
+GZIP_MODE = os.environ.get("UPLOAD_GZIP", "0").lower()   # "0", "1" or "auto"
+GZIP_MIN_BYTES = int(os.environ.get("UPLOAD_GZIP_MIN_BYTES", 1024))
+GZIP_LEVEL = 5
+
+_STRICT = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=lambda v: _default(v))
+_STRICT_SORTED = json.JSONEncoder(ensure_ascii=False, allow_nan=False, sort_keys=True, default=lambda v: _default(v))
+
+
+def _missing(value):
+    if value is None or value is pd.NA or value is pd.NaT:
+        return True
+    return isinstance(value, float) and (math.isnan(value) or math.isinf(value))
+
+
+def _default(value):
+    # Types the encoders don't know: numpy scalars, pandas NA / Timestamps, dates
+    if value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+        return None if _missing(value) else value
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def sanitize(value):
+    # Copy with every NaN / inf / NA replaced by None
+    if isinstance(value, dict):
+        return {key: sanitize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [sanitize(item) for item in value]
+    if _missing(value):
+        return None
+    if isinstance(value, np.generic):
+        return _default(value)
+    return value
+
+
+def encode(payload):
+    # JSON bytes of payload with missing values as null
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    try:
+        return _STRICT.encode(payload).encode("utf-8")
+    except ValueError:
+        return _STRICT.encode(sanitize(payload)).encode("utf-8")
+
+
+def encode_sorted(payload):
+    # Key-sorted text for content hashes: stays identical to
+    # json.dumps(cleaned, sort_keys=True, ensure_ascii=False), whichever encoder is installed
+    try:
+        return _STRICT_SORTED.encode(payload)
+    except ValueError:
+        return _STRICT_SORTED.encode(sanitize(payload))
+
+
+def compress(body):
+    # gzip-compressed body, or None when it isn't worth it
+    if len(body) < GZIP_MIN_BYTES:
+        return None
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
@@ -0,0 +1,225 @@
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_sink import BATCH_SIZE, BATCH_WAIT, TRANSPORTS, UpsertError, configure_sink, get_sink
+from change_manifest import get_manifest
+from dead_letter import (
+    DEAD_LETTER_SUFFIX, failure_details, journal_path_for_dead_letter, load_dead_letters, write_dead_letters,
+)
+from id_cache import get_cache, normalize_name
+from journal import STATUS_FAILED, STATUS_OK, Journal, completed_rows, load_journal
+from metrics import get_metrics, stage
+from university_index import created_university_id, get_university_by_name
+from upload_pipeline import get_course_by_name_and_uni_id, print_run_summary
+from upload_runner import RunCounts, SingleFlightResolver
+
+# Resend only the rows of a dead-letter file (dead_letter.py), concurrently,
+# and only the steps that failed:
+#
+#   python replay.py Education.deadletter.jsonl --workers 16
+#   python replay.py Education.deadletter.jsonl --transport bulk
+#
+# A row whose university was resolved keeps its id and never looks it up
+# again; a failed course update goes straight to PUT with the known course
+# id. Course creates are looked up first only when the first attempt may
+# have gone through (5xx / no response) or never got as far as the check.
+# Rows that repeat a course are sent once with the last row's payload, as in
+# upload_plan. Rows that succeed are marked done in the workbook's journal
+# (so a later --resume skips them), and the file is rewritten with what
+# still fails.
+
+_COURSE_DONE = {"created", "updated", "unchanged"}
+_UNIVERSITY_FAILED = ("university_update_failed", "university_update_error")
+
+class Replayer:
+    def __init__(self, path, workers=16, journal_path=None):
+        self.path = path
+        self.workers = workers
+        self.journal_path = journal_path or journal_path_for_dead_letter(path)
+        self.counts = RunCounts()
+        self.universities = SingleFlightResolver()   # university key -> (id, created)
+        self._lock = threading.Lock()
+        self._remaining = []
+
+    def _send(self, kind, op, payload, entity_id=None):
+        # (response, None) on success, else (response or None, failure details)
+        endpoint = f"{kind}_{op}"
+        try:
+            res = get_sink().upsert(kind, op, payload, entity_id=entity_id)
+        except UpsertError as e:
+            return None, failure_details(endpoint, error=str(e))
+        if res.status_code in [200, 201]:
+            return res, None
+        return res, failure_details(endpoint, res)
+
+    def _resolve_university(self, entry, needs_update):
+        # (uni_id, created, failure): by-name lookup and update/create only
+        # when the first run never got an id, else just the failed update
+        payload = entry.get("universityPayload") or {}
+        uni_id = entry.get("universityId")
+        created = False
+        if uni_id is None:
+            if not payload.get("name"):
+                return None, False, failure_details(None, error="no university payload")
+            found = get_university_by_name(payload["name"])
+            uni_id = found.get("id") if found else None
+            needs_update = found is not None
+        if uni_id is None:
+            # No "not found" may outlive a create that is in flight (id_cache)
+            get_cache().invalidate_university(payload["name"])
+            res, failure = self._send("university", "create", payload)
+            if failure:
+                return None, False, failure
+            uni_id = created_university_id(payload["name"], res.json().get("id"))
+            if uni_id is None:
+                return None, False, failure_details("university_create", res, error="created without an id")
+            created = True
+            self.counts.add("university_created")
+        elif needs_update and payload:
+            res, failure = self._send("university", "update", payload, uni_id)
+            if failure:
+                return uni_id, False, failure
+            self.counts.add("university_updated")
+        if payload:
+            get_manifest().record("university", uni_id, payload)
+        return uni_id, created, None
+
+    def _university(self, entries):
+        needs_update = any(status.startswith(_UNIVERSITY_FAILED) for e in entries for status in e["statuses"])
+        known = next((e["universityId"] for e in entries if e.get("universityId")), None)
+        if known is not None and not needs_update:
+            return known, False, None
+        first = dict(entries[-1], universityId=known)
+        result = {}
+
+        def resolve():
+            result["value"] = self._resolve_university(first, needs_update)
+            uni_id, created, failure = result["value"]
+            return (uni_id, created) if uni_id and not failure else None
+
+        resolved = self.universities.resolve(str(first.get("university")).strip(), resolve)
+        if "value" in result:
+            return result["value"]
+        if resolved:
+            return resolved[0], resolved[1], None
+        return None, False, failure_details(None, error="university could not be resolved")
+
+    def _course(self, entry, uni_id, uni_created):
+        # (course_id, op, failure)
+        payload = dict(entry.get("coursePayload") or {}, universityId=uni_id)
+        course_id = entry.get("courseId")
+        if course_id is None and not uni_created:
+            ambiguous = entry.get("endpoint") != "course_create" or not 400 <= (entry.get("statusCode") or 0) < 500
+            if ambiguous:
+                # The first run never checked, or its create may have gone through anyway
+                get_cache().invalidate_course(payload.get("name"), uni_id)
+                found = get_course_by_name_and_uni_id(payload.get("name"), uni_id)
+                course_id = found.get("id") if found else None
+        op = "update" if course_id else "create"
+        if op == "create":
+            get_cache().invalidate_course(payload.get("name"), uni_id)
+        res, failure = self._send("course", op, payload, course_id)
+        if failure:
+            return course_id, op, failure
+        course_id = course_id or res.json().get("id")
+        if course_id:
+            get_cache().put_course(payload.get("name"), uni_id, course_id)
+            get_manifest().record("course", course_id, payload)
+        self.counts.add(f"course_{op}d")
+        return course_id, op, None
+
+    def _finish(self, entries, ok, uni_id=None, course_id=None, status=None, failure=None):
+        metrics = get_metrics()
+        for entry in entries:
+            message = None if ok else f"[{entry['row']}] replay {status}"
+            self.journal.record(entry["row"], STATUS_OK if ok else STATUS_FAILED, university=entry.get("university"),
+                                uni_id=uni_id, course_id=course_id, message=message)
+            metrics.row_done(entry["row"], ok=ok, statuses=[status], replay=True)
+            if not ok:
+                self.counts.add("failed", cause=status)
+                with self._lock:
+                    self._remaining.append(dict(
+                        entry, **failure, statuses=entry["statuses"] + [status],
+                        universityId=uni_id or entry.get("universityId"), courseId=course_id or entry.get("courseId"),
+                    ))
+
+    def replay_group(self, entries):
+        # entries: rows of one university (and course, when the course step failed), by row number
+        with stage("resolve"):
+            uni_id, created, failure = self._university(entries)
+        if failure:
+            return self._finish(entries, False, uni_id, status="replay_university_failed", failure=failure)
+        if all(_COURSE_DONE & set(e["statuses"]) for e in entries):
+            return self._finish(entries, True, uni_id, entries[-1].get("courseId"), "university_replayed")
+        with stage("upsert"):
+            course_id, op, failure = self._course(entries[-1], uni_id, created)
+        if failure:
+            return self._finish(entries, False, uni_id, course_id, f"replay_{op}_failed", failure)
+        self._finish(entries, True, uni_id, course_id, f"{op}d")
+
+    def _guarded(self, entries):
+        try:
+            self.replay_group(entries)
+        except Exception as e:
+            self._finish(entries, False, status="replay_unhandled_error", failure=failure_details(None, error=str(e)))
+
+    def groups(self, entries):
+        groups = {}
+        for entry in sorted(entries, key=lambda e: e["row"]):
+            university = normalize_name(str(entry.get("university")).strip())
+            if _COURSE_DONE & set(entry["statuses"]):
+                key = (university, None, entry["row"])
+            else:
+                course = (entry.get("coursePayload") or {}).get("name")
+                key = (university, normalize_name(course) if course else f"row:{entry['row']}")
+            groups.setdefault(key, []).append(entry)
+        return list(groups.values())
+
+    def run(self):
+        entries = load_dead_letters(self.path)
+        done = completed_rows(load_journal(self.journal_path))
+        pending = [entry for row, entry in entries.items() if row not in done]
+        print(f"📮 {self.path}: {len(entries)} dead letters, {len(entries) - len(pending)} already done per "
+              f"{self.journal_path}, {len(pending)} to replay")
+        get_metrics().set_total(len(pending))
+        groups = self.groups(pending)
+
+        self.journal = Journal(self.journal_path, resume=True)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(self._guarded, groups))
+        finally:
+            get_sink().close()
+            self.journal.close()
+
+        write_dead_letters(self.path, sorted(self._remaining, key=lambda e: e["row"]))
+        print(f"\n📮 Replayed {len(pending)} rows in {len(groups)} groups; "
+              f"{len(self._remaining)} still failing → {self.path}")
+        return self._remaining
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resend the rows of a dead-letter file")
+    parser.add_argument("dead_letters", help=f"Dead-letter file (<workbook>{DEAD_LETTER_SUFFIX})")
+    parser.add_argument("--journal", help="Workbook journal to mark replayed rows in (default: next to the file)")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("UPLOAD_WORKERS", 16)), help="Sending threads")
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default=os.environ.get("UPLOAD_TRANSPORT", "per-record"))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Max upserts per bulk request")
+    parser.add_argument("--batch-wait", type=float, default=BATCH_WAIT,
+                        help="Seconds a partial batch waits for more upserts before it is sent")
+    args = parser.parse_args()
+
+    configure_sink(args.transport, batch_size=args.batch_size, max_wait=args.batch_wait)
+    workers = args.workers
+    if args.transport == "bulk":
+        # Each sending thread waits for its row's batch, so it takes about a batch of them to fill one
+        workers = max(workers, args.batch_size)
+    replayer = Replayer(args.dead_letters, workers=workers, journal_path=args.journal)
+    replayer.run()
+    print_run_summary(replayer.counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import os
+import re
+from functools import lru_cache
+
+import pandas as pd
+
+# Per-value parsers shared by the upload scripts. parse_rows() runs the ones
+# a schema asks for (its parsed_fields) on each row, once per distinct value
+# of each column, and puts the results, ready to send, in row["parsed"]:
+#
+#   fees           fees, feesCurrency, feesRange      ('Yearly Tuition Fees')
+#   duration       durationLabel, durationValue       ('Duration')
+#   intakes        intakeMonths                       ('Open Intakes')
+#   exams          examAccepted                       (IELTS / TOEFL / PTE)
+#   work_visa      workVisaPermitValue, workVisaPermitLabel
+#   ranking_text   ranking      (multi-line 'University Ranking' text)
+#   split_ranking  ranking      ('QS  Ranking' + 'The World Ranking' columns)
+
+MONTH_MAP = {
+    'Jan': 'January', 'Feb': 'February', 'Mar': 'March', 'Apr': 'April',
+    'May': 'May', 'Jun': 'June', 'Jul': 'July', 'Aug': 'August',
+    'Sep': 'September', 'Oct': 'October', 'Nov': 'November', 'Dec': 'December'
+}
+MONTH_PATTERN = re.compile(r'Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec', flags=re.IGNORECASE)
+EXAM_COLUMNS = ['IELTS Score', 'TOEFL Score', 'PTE Score']
+
+_FEE_NUMBER = re.compile(r'[\d,\.]+')
+_LEADING_INT = re.compile(r'(\d+)')
+_VISA_YEARS = re.compile(r'([\d.]+)\s*year')
+_VISA_MONTHS = re.compile(r'([\d.]+)\s*month')
+_VISA_WEEKS = re.compile(r'([\d.]+)\s*week')
+
+
+def parse_fees_and_currency(fee_str):
+    if not isinstance(fee_str, str) or fee_str.strip() == "":
+        return None, 'GBP'  # Currency always needed
+
+    fee_str = fee_str.strip()
+
+    # Find where the first digit starts (we assume currency is prefix)
+    for i, ch in enumerate(fee_str):
+        if ch.isdigit():
+            currency = fee_str[:i].strip() or 'GBP'
+            remainder = fee_str[i:]
+
+            # Try to extract the number from remainder
+            num_match = _FEE_NUMBER.match(remainder)
+            if num_match:
+                fee_raw = num_match.group()
+                try:
+                    fee = float(fee_raw.replace(',', ''))
+                except ValueError:
+                    fee = None
+                return fee, currency
+
+            break  # Stop if first digit is found but no valid number follows
+
+    # Fallback: couldn't find a digit — assume fee is missing, try to fix anyway
+    return None, fee_str.strip() or 'GBP'
+
+def parse_duration(duration_str):
+    match = _LEADING_INT.match(str(duration_str))
+    return int(match.group(1)) if match else None
+
+def parse_ranking(ranking_raw):
+    rankings = []
+    if isinstance(ranking_raw, str):
+        for line in ranking_raw.split('\n'):
+            parts = line.split(' - ')
+            name = parts[0].strip().split(" Ranking")[0]
+            try:
+                rank = int(parts[1].strip()) if len(parts) > 1 and parts[1].strip().isdigit() else None
+            except ValueError:
+                rank = None
+            rankings.append({'name': name, 'rank': rank})
+    return rankings
+
+def parse_single_ranking(name, value):
+    if pd.isna(value): return None
+    match = _LEADING_INT.search(str(value))
+    return {"name": name, "rank": int(match.group(1))} if match else None
+
+def normalize_months(months_str):
+    if not isinstance(months_str, str):
+        return []
+    month_codes = MONTH_PATTERN.findall(months_str)
+    found = {MONTH_MAP.get(m.capitalize()) for m in month_codes}
+    # Calendar order (not set order) so the payload - and its manifest hash - is stable across runs
+    return [month for month in MONTH_MAP.values() if month in found]
+
+def extract_exam_scores(row):
+    scores = []
+    for exam in EXAM_COLUMNS:
+        val = row.get(exam)
+        try:
+            score = float(str(val).strip())
+            scores.append({"name": exam.split(' ')[0], "score": score})
+        except:
+            continue
+    return scores
+
+def parse_work_visa(raw):
+    if pd.isna(raw) or str(raw).strip() == "":
+        return None, ""
+
+    raw = str(raw).strip().lower()
+
+    # Years
+    match_year = _VISA_YEARS.match(raw)
+    if match_year:
+        months = int(float(match_year.group(1)) * 12)
+        return months, f"{months} Months"
+
+    # Months
+    match_month = _VISA_MONTHS.match(raw)
+    if match_month:
+        months = int(float(match_month.group(1)))
+        return months, f"{months} Months"
+
+    # Weeks (convert to months approx.)
+    match_weeks = _VISA_WEEKS.match(raw)
+    if match_weeks:
+        months = int(float(match_weeks.group(1)) / 4.345)
+        return months, f"{months} Months"
+
+    return None, raw  # fallback if unknown format
+
+
+# === Row -> parsed fields ===
+#
+# A column repeats the same few values over and over (a university's
+# ranking text on each of its courses, "12 Months", "Sep, Jan"), so each
+# column's parse runs once per distinct cell value: the per-column steps
+# below are memoized on the raw cell (typed, so 1, 1.0 and True stay
+# apart) and hand back immutable results that parse_fields() copies into
+# fresh lists / dicts for each row. SCALAR is the same steps unmemoized;
+# `python row_parsers.py` checks both give the same fields on every row of
+# the workbooks.
+
+DISTINCT_VALUES = int(os.environ.get("UPLOAD_PARSE_CACHE", 8192))   # remembered values per column
+
+
+def _fees(raw):
+    fee, curr = parse_fees_and_currency(str(raw))
+    return fee, curr or "GBP", str(raw) if pd.notna(raw) else None
+
+
+def _duration(raw):
+    label = str(raw)
+    return label, parse_duration(label)
+
+
+def _intakes(raw):
+    return tuple(normalize_months(raw))
+
+
+def _exam(raw):
+    try:
+        return float(str(raw).strip())
+    except ValueError:
+        return None
+
+
+def _ranking_text(raw):
+    return tuple((ranking['name'], ranking['rank']) for ranking in parse_ranking(raw))
+
+
+def _single_ranking(name, raw):
+    ranking = parse_single_ranking(name, raw)
+    return (ranking['name'], ranking['rank']) if ranking else None
+
+
+SCALAR = {
+    "fees": _fees, "duration": _duration, "intakes": _intakes, "exam": _exam,
+    "work_visa": parse_work_visa, "ranking_text": _ranking_text, "single_ranking": _single_ranking,
+}
+DISTINCT = {name: lru_cache(maxsize=DISTINCT_VALUES, typed=True)(step) for name, step in SCALAR.items()}
+
+
+def parse_fields(record, fields, steps=DISTINCT):
+    # The payload fields a row's `fields` parse steps produce
+    out = {}
+    if "fees" in fields:
+        out["fees"], out["feesCurrency"], out["feesRange"] = steps["fees"](record.get('Yearly Tuition Fees', ''))
+    if "duration" in fields:
+        out["durationLabel"], out["durationValue"] = steps["duration"](record.get('Duration', ''))
+    if "intakes" in fields:
+        out["intakeMonths"] = list(steps["intakes"](record.get('Open Intakes', '')))
+    if "exams" in fields:
+        scores = ((exam, steps["exam"](record.get(exam))) for exam in EXAM_COLUMNS)
+        out["examAccepted"] = [{"name": exam.split(' ')[0], "score": score} for exam, score in scores if score is not None]
+    if "work_visa" in fields:
+        out["workVisaPermitValue"], out["workVisaPermitLabel"] = steps["work_visa"](record.get('Work Visa Permit', ''))
+    if "ranking_text" in fields:
+        out["ranking"] = [{'name': name, 'rank': rank}
+                          for name, rank in steps["ranking_text"](record.get('University Ranking', ''))]
+    if "split_ranking" in fields:
+        rankings = (steps["single_ranking"]("QS", record.get("QS  Ranking")),
+                    steps["single_ranking"]("THE", record.get("The World Ranking")))
+        out["ranking"] = [{"name": name, "rank": rank} for name, rank in filter(None, rankings)]
+    return out
+
+
+def parse_rows(rows, fields):
+    # Wraps a (row_number, record) stream, attaching parse_fields() as record["parsed"]
+    for row_number, record in rows:
+        record["parsed"] = parse_fields(record, fields)
+        yield row_number, record
+
+
+# === Parity check against the per-row path ===
+
+def check_parity(path, schema):
+    from workbook_reader import iter_rows
+
+    mismatches = rows = 0
+    for index, record in iter_rows(path, schema.columns):
+        rows += 1
+        ours, scalar = parse_fields(record, schema.parsed_fields), parse_fields(record, schema.parsed_fields, SCALAR)
+        # repr, so NaN scores compare equal
+        if repr(ours) != repr(scalar):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"❌ {path} row {index + 1}: {ours!r} vs per-row {scalar!r}")
+    print(f"{'✅' if not mismatches else '❌'} {path} ({schema.name}): {rows} rows, {mismatches} mismatches with the per-row parsers")
+    return mismatches
+
+
+if __name__ == "__main__":
+    import sys
+
+    from upload_schemas import detect_schema
+    from workbook_reader import workbook_columns
+
+    paths = sys.argv[1:] or ['Education.xlsx', 'CSE.xlsx', 'Commerce.xlsx', 'studyreach_unique_courses_filtered_.xlsx']
+    failed = 0
+    for path in paths:
+        schema = detect_schema(workbook_columns(path))
+        failed += check_parity(path, schema) if schema is not None else 0
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,140 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+
+from dead_letter import DEAD_LETTER_SUFFIX, dead_letter_path_for, load_dead_letters, write_dead_letters
+from id_cache import normalize_name
+from journal import completed_rows, journal_path_for, load_journal
+from log_sinks import failure_row_key
+
+# Deterministic sharding of a workbook by university, so N processes (or
+# Railway instances) can upload it in parallel:
+#
+#   python upload_KC_Courses.py --shard 0/4      # ... 1/4, 2/4, 3/4
+#   python shards.py merge Education.xlsx --shards 4
+#
+# A row belongs to shard hash(normalized university name) % N, using a
+# fixed hash (not Python's per-process salted hash()), so every process
+# agrees and each university, with all of its courses, is owned by exactly
+# one shard: no two shards ever race to create the same university.
+#
+# Each shard writes its own journal / metrics log / failure report with a
+# ".shard-i-of-N" label in the name. `merge` folds a workbook's shard
+# journals back into <workbook>.journal.jsonl (so an unsharded --resume
+# picks up where the shards left off), and their failure reports and dead
+# letters into one each.
+
+SHARD_ENV = "UPLOAD_SHARD"   # e.g. UPLOAD_SHARD=2/4 on the third instance
+_OUTPUT_SUFFIXES = (".journal.jsonl", ".metrics.jsonl", ".failed.txt", DEAD_LETTER_SUFFIX)
+
+
+def parse_shard(value):
+    # "i/N" -> (i, N) with 0 <= i < N; None for an empty value
+    if not value:
+        return None
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", str(value))
+    if not match or not 0 <= int(match.group(1)) < int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"shard must be i/N with 0 <= i < N, got {value!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def shard_of(university_name, count):
+    digest = hashlib.blake2b(normalize_name(university_name).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def in_shard(university_name, shard):
+    return shard is None or shard_of(university_name, shard[1]) == shard[0]
+
+
+def shard_label(shard):
+    return f".shard-{shard[0]}-of-{shard[1]}" if shard else ""
+
+
+def shard_path(path, shard):
+    # Education.journal.jsonl -> Education.shard-1-of-4.journal.jsonl
+    if not shard:
+        return path
+    for suffix in _OUTPUT_SUFFIXES:
+        if path.endswith(suffix):
+            return path[:-len(suffix)] + shard_label(shard) + suffix
+    stem, ext = os.path.splitext(path)
+    return stem + shard_label(shard) + ext
+
+
+# === merge ===
+
+def merge_journals(excel_file, count):
+    # Writes the shards' last outcome per row into the unsharded journal
+    merged = {}
+    for index in range(count):
+        path = shard_path(journal_path_for(excel_file), (index, count))
+        if not os.path.exists(path):
+            print(f"⚠️ {path} is missing; shard {index}/{count} never ran or wrote nothing")
+            continue
+        entries = load_journal(path)
+        print(f"📒 {path}: {len(entries)} rows, {len(completed_rows(entries))} done")
+        merged.update(entries)
+    out = journal_path_for(excel_file)
+    with open(out, "w", encoding="utf-8") as f:
+        for row in sorted(merged):
+            f.write(json.dumps(merged[row], ensure_ascii=False, default=str) + "\n")
+    print(f"📒 Merged journal → {out}: {len(merged)} rows, {len(completed_rows(merged))} done")
+    return out
+
+
+def merge_failed_reports(report, count):
+    # failed.shard-*-of-N.txt -> failed.txt, sorted by row number
+    lines = []
+    found = 0
+    for index in range(count):
+        path = shard_path(report, (index, count))
+        if os.path.exists(path):
+            found += 1
+            with open(path, encoding="utf-8") as f:
+                lines.extend(line.rstrip("\n") for line in f if line.strip())
+    if not found:
+        return None
+    with open(report, "w", encoding="utf-8") as f:
+        for line in sorted(lines, key=failure_row_key):
+            f.write(line + "\n")
+    print(f"📄 Merged {found} failure reports → {report}: {len(lines)} failed rows")
+    return report
+
+
+def merge_dead_letters(excel_file, count):
+    merged = {}
+    for index in range(count):
+        merged.update(load_dead_letters(shard_path(dead_letter_path_for(excel_file), (index, count))))
+    if not merged:
+        return None
+    out = dead_letter_path_for(excel_file)
+    write_dead_letters(out, [merged[row] for row in sorted(merged)])
+    print(f"📮 Merged dead letters → {out}: {len(merged)} rows")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Combine the per-shard outputs of a sharded upload")
+    commands = parser.add_subparsers(dest="command", required=True)
+    merge = commands.add_parser("merge", help="Merge shard journals and failure reports")
+    merge.add_argument("workbooks", nargs="+", help="Workbooks (or globs) the shards uploaded")
+    merge.add_argument("--shards", type=int, required=True, help="N, the number of shards")
+    merge.add_argument("--failed-report", default="failed.txt",
+                       help="Failure report of the single-workbook scripts (default: failed.txt)")
+    args = parser.parse_args()
+
+    workbooks = [path for pattern in args.workbooks for path in (sorted(glob.glob(pattern)) or [pattern])]
+    for path in workbooks:
+        merge_journals(path, args.shards)
+        merge_dead_letters(path, args.shards)
+        # upload_all.py writes <workbook>.failed.txt
+        merge_failed_reports(f"{os.path.splitext(path)[0]}.failed.txt", args.shards)
+    merge_failed_reports(args.failed_report, args.shards)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import threading
+from urllib.parse import quote
+
+import api_client
+from api_client import BASE_URL
+from id_cache import MISS, get_cache, normalize_name
+from name_matching import FuzzyNameIndex
+
+# In-memory name -> id index of every university the API knows, fetched once
+# per run from the paged list endpoint:
+#
+#   GET /v1/marketplace/study-abroad/universities?page=1&limit=500
+#
+# so a script can resolve spreadsheet names locally instead of calling
+# /universities/by-name/{name} per row. Names are matched with
+# id_cache.normalize_name (whitespace collapsed, case-folded). A normalized
+# name that maps to more than one id is ambiguous and is left out, so the
+# caller falls back to the exact by-name lookup for it.
+#
+# match() is the approximate lookup (name_matching.FuzzyNameIndex) for
+# names neither the index nor by-name know, e.g. "Univ. of Salford".
+#
+# The paging itself is api_client.iter_pages.
+#
+# get_university_by_name() is that exact lookup, shared by every script.
+# The name is quoted whole, so '/', '&', '#' and '?' stay part of it.
+
+LIST_URL = f"{BASE_URL}/v1/marketplace/study-abroad/universities"
+
+
+def created_university_id(name, uni_id):
+    # Records the id a university create answered with. A create that
+    # answered without one is looked up by name instead, and the name is
+    # never left cached as "not found" now that it exists.
+    if uni_id is not None:
+        get_cache().put_university(name, uni_id)
+        return uni_id
+    get_cache().invalidate_university(name)
+    found = get_university_by_name(name)
+    if found and found.get("id") is not None:
+        return found["id"]
+    get_cache().invalidate_university(name)   # by-name may not see it yet
+    return None
+
+
+def get_university_by_name(name):
+    cached = get_cache().get_university(name)
+    if cached is not MISS:
+        return {"id": cached} if cached else None
+    try:
+        res = api_client.get(f"{LIST_URL}/by-name/{quote(name, safe='')}", endpoint="university_by_name")
+        if res.status_code in [200, 201]:
+            uni_info = res.json()
+            get_cache().put_university(name, uni_info.get("id"))
+            return uni_info
+        if res.status_code == 404:
+            get_cache().put_university(name, None)
+        else:
+            print(f"⚠️ GET failed for '{name}' → {res.status_code}: {res.text}")
+    except Exception as e:
+        print(f"[ERROR] get_university_by_name('{name}'): {e}")
+    return None
+
+
+class UniversityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}          # normalized name -> id
+        self._ambiguous = set()
+        self.fuzzy = FuzzyNameIndex()
+        self.loaded = False
+        self.stats = {"universities": 0, "pages": 0, "hits": 0, "misses": 0, "ambiguous": 0}
+
+    def add(self, name, uni_id):
+        if not name or uni_id is None:
+            return
+        key = normalize_name(name)
+        with self._lock:
+            self.fuzzy.add(name, uni_id)
+            if key in self._ambiguous:
+                return
+            known = self._ids.get(key)
+            if known is not None and known != uni_id:
+                del self._ids[key]
+                self._ambiguous.add(key)
+                return
+            self._ids[key] = uni_id
+
+    def load(self, page_size=api_client.PAGE_SIZE):
+        # Fetch every page; returns False (index left partial) if a page fails
+        try:
+            for items in api_client.iter_pages(LIST_URL, "university_list", page_size=page_size):
+                for item in items:
+                    if isinstance(item, dict):
+                        self.add(item.get("name"), item.get("id"))
+                self.stats["pages"] += 1
+                self.stats["universities"] += len(items)
+        except api_client.PageError as e:
+            print(f"⚠️ University list {e}")
+            return False
+        self.loaded = True
+        return True
+
+    def lookup(self, name):
+        # The id for a name, or None when the index doesn't have it (or it's ambiguous)
+        key = normalize_name(name)
+        with self._lock:
+            uni_id = self._ids.get(key)
+            if uni_id is not None:
+                self.stats["hits"] += 1
+            elif key in self._ambiguous:
+                self.stats["ambiguous"] += 1
+            else:
+                self.stats["misses"] += 1
+        return uni_id
+
+    def match(self, name):
+        # (id, matched name, score) of the closest known name, or None
+        with self._lock:
+            return self.fuzzy.match(name)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids)
+
+    def print_summary(self):
+        s = self.stats
+        print(f"📇 University index: {len(self)} names from {s['universities']} universities "
+              f"({s['pages']} pages) · {s['hits']} hits, {s['misses']} misses, {s['ambiguous']} ambiguous")
+        fuzzy = self.fuzzy.stats
+        if fuzzy["queries"]:
+            print(f"   Approximate matches: {fuzzy['matches']}/{fuzzy['queries']} names, "
+                  f"{fuzzy['seconds'] * 1000 / fuzzy['queries']:.2f} ms per lookup")
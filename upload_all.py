@@ -0,0 +1,201 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_sink import configure_sink
+from dead_letter import DeadLetter, dead_letter_path_for
+from journal import Journal, journal_path_for
+from log_sinks import FailureReport
+from shards import in_shard, shard_path
+from metrics import get_metrics
+from row_parsers import parse_rows
+from upload_pipeline import (
+    UploadPipeline, add_upload_arguments, load_course_catalog, load_resume_state, load_university_index,
+    print_run_summary, report_total, stage_workers,
+)
+from upload_runner import RunCounts, SingleFlightResolver
+from upload_schemas import detect_schema
+from workbook_reader import iter_rows, workbook_columns
+
+# Upload several workbooks in one run:
+#
+#   python upload_all.py Education.xlsx CSE.xlsx Commerce.xlsx studyreach_unique_courses_filtered_.xlsx
+#   python upload_all.py "*.xlsx" --workers 8
+#
+# Each workbook's schema is picked from its header (upload_schemas.detect_schema).
+# Reading + parsing runs in a process pool, one workbook per process,
+# streaming parsed batches back over a bounded queue. Every workbook gets its
+# own UploadPipeline (journal, failure report) but they all share one
+# university resolver, so a university that appears in several workbooks is
+# looked up and updated / created once per run.
+
+DEFAULT_WORKBOOKS = ["*.xlsx"]
+ROWS_PER_MESSAGE = 500  # parsed rows per message from a parse process
+BATCHES_IN_FLIGHT = 4   # messages buffered per workbook
+
+
+def parse_workbook(path, columns, parsed_fields, done, out_queue, shard=None):
+    # Runs in a pool process: streams batches of (row_number, row) with
+    # row["parsed"] filled in, then ("done", ...) or ("error", ...). Each
+    # message carries the read/parse seconds spent since the last one.
+    metrics = get_metrics()
+    sent = {}
+
+    def stage_delta():
+        snapshot = {name: metrics.stage_seconds[name] for name in ("read", "parse")}
+        delta = {name: seconds - sent.get(name, 0.0) for name, seconds in snapshot.items()}
+        sent.update(snapshot)
+        return delta
+
+    try:
+        rows = (
+            (index + 1, row)
+            for index, row in metrics.timed_iter(iter_rows(path, columns), "read")
+            if index + 1 not in done and in_shard(row['University'], shard)
+        )
+        batch = []
+        for item in metrics.timed_iter(parse_rows(rows, parsed_fields), "parse"):
+            batch.append(item)
+            if len(batch) >= ROWS_PER_MESSAGE:
+                out_queue.put(("rows", batch, stage_delta()))
+                batch = []
+        if batch:
+            out_queue.put(("rows", batch, stage_delta()))
+        out_queue.put(("done", None, stage_delta()))
+    except Exception as e:
+        out_queue.put(("error", f"{type(e).__name__}: {e}", stage_delta()))
+
+
+def queued_rows(path, in_queue):
+    # Row source for a pipeline: the batches parse_workbook sends back
+    metrics = get_metrics()
+    while True:
+        kind, payload, seconds = in_queue.get()
+        for name, value in (seconds or {}).items():
+            metrics.add_stage_time(name, value)
+        if kind == "done":
+            return
+        if kind == "error":
+            raise RuntimeError(f"parsing {path} failed: {payload}")
+        yield from payload
+
+
+def _report_crash(rows_queue):
+    # If the pool process dies, the pipeline would wait on its queue forever
+    def callback(future):
+        if future.exception() is not None:
+            rows_queue.put(("error", repr(future.exception()), None))
+    return callback
+
+
+def failed_report_path(path, shard=None):
+    return shard_path(f"{os.path.splitext(path)[0]}.failed.txt", shard)
+
+
+def expand_workbooks(patterns):
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload courses from several workbooks with a shared university resolver")
+    parser.add_argument("workbooks", nargs="*", default=DEFAULT_WORKBOOKS, help="Workbooks or globs (default: *.xlsx)")
+    parser.add_argument("--parse-processes", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Processes reading and parsing workbooks (one workbook each at a time)")
+    add_upload_arguments(parser)
+    args = parser.parse_args()
+
+    jobs = []
+    for path in expand_workbooks(args.workbooks):
+        if not os.path.exists(path):
+            print(f"⚠️ Skipping {path}: file not found")
+            continue
+        schema = detect_schema(workbook_columns(path))
+        if schema is None:
+            print(f"⚠️ Skipping {path}: no schema matches its columns")
+            continue
+        jobs.append((path, schema))
+    if not jobs:
+        print("❌ No workbooks to upload.")
+        return
+    print("📚 " + ", ".join(f"{path} ({schema.name})" for path, schema in jobs))
+
+    universities = SingleFlightResolver()
+    counts = RunCounts()
+    university_index = load_university_index(args)
+    course_catalog = load_course_catalog(args)
+    workers = stage_workers(args)
+    sink = configure_sink(args.transport, batch_size=args.batch_size, max_wait=args.batch_wait)
+    metrics = get_metrics()
+    metrics.open_log(args.metrics_log or shard_path("upload_all.metrics.jsonl", args.shard))
+    metrics.event("config", files=[path for path, _ in jobs], workers=workers, transport=args.transport,
+                  resume=args.resume, parse_processes=args.parse_processes, shard=args.shard)
+    if args.shard:
+        print(f"🧩 Shard {args.shard[0]}/{args.shard[1]}: only universities that hash to it")
+    shards = args.shard[1] if args.shard else 1
+
+    manager = multiprocessing.Manager()
+    pool = ProcessPoolExecutor(max_workers=args.parse_processes)
+    runs = []
+    for path, schema in jobs:
+        journal_path = shard_path(journal_path_for(path), args.shard)
+        done = load_resume_state(journal_path, universities, counts) if args.resume else set()
+        pipeline = UploadPipeline(
+            schema, workers=workers, queue_size=args.queue_size, skip_unchanged=args.skip_unchanged,
+            journal=Journal(journal_path, resume=args.resume), universities=universities, counts=counts,
+            label=os.path.basename(path), university_index=university_index, course_catalog=course_catalog,
+            dead_letter=DeadLetter(shard_path(dead_letter_path_for(path), args.shard), resume=args.resume, source=path),
+            failed_report=FailureReport(failed_report_path(path, args.shard)),
+        )
+        rows_queue = manager.Queue(maxsize=BATCHES_IN_FLIGHT)
+        future = pool.submit(parse_workbook, path, schema.columns, schema.parsed_fields, done, rows_queue, args.shard)
+        future.add_done_callback(_report_crash(rows_queue))
+        threading.Thread(
+            target=report_total, args=(path, metrics.add_total, 0, shards, len(done)), daemon=True,
+        ).start()
+        runs.append({"path": path, "pipeline": pipeline, "queue": rows_queue, "error": None})
+
+    def upload(run):
+        try:
+            run["pipeline"].run(queued_rows(run["path"], run["queue"]))
+        except Exception as e:
+            run["error"] = str(e)
+            print(f"\n❌ {run['path']}: {e}")
+        finally:
+            run["pipeline"].journal.close()
+            run["pipeline"].dead_letter.close()
+            run["pipeline"].failed_report.close()
+
+    threads = [threading.Thread(target=upload, args=(run,), name=f"upload-{run['path']}") for run in runs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sink.close()
+    pool.shutdown()
+    manager.shutdown()
+
+    # One failure report per workbook
+    print()
+    for run in runs:
+        report = run["pipeline"].failed_report
+        dead_letter = run["pipeline"].dead_letter
+        status = f"❌ {run['error']}" if run["error"] else f"{report.count} failed → {report.path}"
+        if dead_letter.written:
+            status += f", payloads → {dead_letter.path}"
+        print(f"📄 {run['path']}: {status}")
+        metrics.event("workbook", path=run["path"], failed=report.count, report=report.path, error=run["error"])
+    print(f"🏛️ Universities resolved once for all workbooks: {len(universities)}")
+    print_run_summary(counts, university_index, course_catalog)
+
+
+if __name__ == "__main__":
+    main()
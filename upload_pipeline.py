@@ -0,0 +1,602 @@
+import argparse
+import os
+import queue
+import threading
+
+import api_client
+from api_client import BASE_URL
+from batch_sink import BATCH_SIZE, BATCH_WAIT, TRANSPORTS, configure_sink, get_sink
+from change_manifest import get_manifest
+from course_catalog import CourseCatalog
+from dead_letter import DeadLetter, dead_letter_path_for, failure_details
+from id_cache import MISS, get_cache, normalize_name
+from journal import (
+    STATUS_FAILED, STATUS_OK, Journal, completed_rows, journal_path_for, load_journal, resolved_universities,
+)
+from log_sinks import FailureReport
+from metrics import get_metrics, metrics_log_path_for, stage
+from row_parsers import parse_rows
+from shards import SHARD_ENV, in_shard, parse_shard, shard_path
+from university_index import UniversityIndex, created_university_id, get_university_by_name
+from upload_runner import RunCounts, SingleFlightResolver, failure_cause
+from workbook_reader import iter_rows, row_count
+
+# The course upload shared by upload_script.py and upload_KC_Courses.py,
+# driven by a declarative Schema (upload_schemas). Rows flow through
+# stages connected by bounded queues, each with its own threads:
+#
+#   row source  -> build      -> university   -> course          -> upsert
+#   (read+parse)   (payloads,    (single-flight  (course catalog or (create/update
+#                   cleaning)     lookup/PUT/     /courses/check,    via batch_sink)
+#                                 create)         skip-unchanged)
+#
+# A full queue blocks the stage feeding it, so the workbook is never read
+# much further ahead than the API can keep up with, while payload building
+# overlaps the network stages.
+
+PROGRESS_EVERY = 250  # finished rows between progress lines
+STAGES = ["build", "university", "course", "upsert"]
+
+# === API Calls ===
+
+def create_university(data, failure=None):
+    # failure: optional dict that gets the failed request's details.
+    # The by-name miss that led here was cached as "not found"; it is dropped
+    # before sending, so a create that fails, times out or dies with the
+    # process is looked up again next time instead of sent blind.
+    get_cache().invalidate_university(data['name'])
+    try:
+        res = get_sink().upsert("university", "create", data)
+        if res.status_code in [200, 201]:
+            uni_info = res.json()
+            uni_info["id"] = created_university_id(data['name'], uni_info.get("id"))
+            if uni_info["id"] is not None:
+                return uni_info
+            print(f"[ERROR] University created without an id and not found by name: {data['name']} → {res.text}")
+            if failure is not None:
+                failure.update(failure_details("university_create", res, error="created without an id"))
+        else:
+            print(f"[ERROR] University creation failed: {data['name']} → {res.status_code}: {res.text}")
+            if failure is not None:
+                failure.update(failure_details("university_create", res))
+    except Exception as e:
+        print(f"[ERROR] Exception in university creation: {data['name']} → {e}")
+        if failure is not None:
+            failure.update(failure_details("university_create", error=str(e)))
+    return None
+
+def get_course_by_name_and_uni_id(name, uni_id):
+    cached = get_cache().get_course(name, uni_id)
+    if cached is not MISS:
+        return {"id": cached} if cached else None
+    try:
+        res = api_client.post(
+            f"{BASE_URL}/v1/marketplace/study-abroad/courses/check",
+            endpoint="course_check",
+            params={"name": name, "universityId": uni_id},
+        )
+        if res.status_code in [200, 201]:
+            cou_info = res.json()
+            get_cache().put_course(name, uni_id, cou_info.get("id"))
+            return cou_info
+        if res.status_code == 404:
+            get_cache().put_course(name, uni_id, None)
+    except Exception as e:
+        print(f"[ERROR] get_course_by_name_and_uni_id: {name} → {e}")
+    return None
+
+def update_course(course_id, course_payload, row_number=None):
+    try:
+        res = get_sink().upsert("course", "update", course_payload, entity_id=course_id, row_number=row_number)
+        if res.status_code == 404:
+            # Course is gone server-side; drop the stale mapping
+            get_cache().invalidate_course(course_payload.get("name"), course_payload.get("universityId"))
+            get_manifest().forget("course", course_id)
+        return res
+    except Exception as e:
+        return {"error": str(e)}
+
+
+# === Pipeline ===
+
+_DONE = object()  # end-of-input marker, one per downstream worker
+
+
+class RowJob:
+    # One workbook row on its way through the stages
+    __slots__ = (
+        "row_number", "row", "course_log", "university_key", "university_payload",
+        "course_payload", "uni_id", "course_id", "course_key", "failure",
+    )
+
+    def __init__(self, row_number, row):
+        self.row_number = row_number
+        self.row = row
+        self.course_log = {
+            "course": row.get('Program Name'),
+            "university": row.get('University'),
+            "status": [],
+            "errorMessage": None,
+        }
+        self.university_key = None
+        self.university_payload = None
+        self.course_payload = None
+        self.uni_id = None
+        self.course_id = None
+        self.course_key = None
+        self.failure = None   # failure_details of the request that failed, for the dead letter
+
+
+class InflightKeys:
+    # At most one row per key between the course check and its upsert, so
+    # two rows for the same course can't both miss /courses/check and both
+    # create it; the second one waits and then finds the first one's course.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = {}
+
+    def acquire(self, key):
+        while True:
+            with self._lock:
+                event = self._events.get(key)
+                if event is None:
+                    self._events[key] = threading.Event()
+                    return
+            event.wait()
+
+    def release(self, key):
+        with self._lock:
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+class UploadPipeline:
+    def __init__(self, schema, workers=None, queue_size=None, skip_unchanged=False, journal=None,
+                 universities=None, counts=None, label=None, university_index=None, course_catalog=None,
+                 dead_letter=None, failed_report=None):
+        self.schema = schema
+        # Prefix for printed failure lines when several workbooks run at once
+        self.prefix = f"{label} " if label else ""
+        # workers: {stage: thread count}; payload building is CPU-bound, so one thread by default
+        self.workers = {"build": 1, "university": 1, "course": 1, "upsert": 1, **(workers or {})}
+        self.queue_size = queue_size or max(16, 4 * max(self.workers.values()))
+        self.skip_unchanged = skip_unchanged
+        self.journal = journal
+        # Failed rows with their payloads and ids, for replay.py
+        self.dead_letter = dead_letter
+        # log_sinks.FailureReport that failure lines stream to; kept in memory without one
+        self.failed_report = failed_report
+        self.universities = universities if universities is not None else SingleFlightResolver()
+        self.counts = counts if counts is not None else RunCounts()
+        # With --fuzzy-match: known names, so a spelling variant reuses the
+        # existing university instead of creating a duplicate
+        self.university_index = university_index
+        # Per-university course lists that replace the per-row /courses/check
+        self.course_catalog = course_catalog
+        self.queues = {}
+        self._courses_inflight = InflightKeys()
+        self._lock = threading.Lock()
+        self._failed = []
+        self._finished = 0
+
+    # === Stages ===
+
+    def _build(self, job):
+        with stage("build"):
+            job.university_key = str(job.row['University']).strip()
+            # NaN cells stay as they are; payload_codec sends them as null
+            job.university_payload = self.schema.university_payload(job.row)
+            job.course_payload = self.schema.course_payload(job.row)
+        return job
+
+    def _resolve_university(self, job):
+        # Single-flight: only one worker resolves/creates a given university
+        with stage("resolve"):
+            job.uni_id = self.universities.resolve(job.university_key, lambda: self._get_or_create_or_update_university(job))
+        if not job.uni_id:
+            return self._finish(job)
+        job.course_payload["universityId"] = job.uni_id
+        return job
+
+    def _get_or_create_or_update_university(self, job):
+        course_log = job.course_log
+        university_payload = job.university_payload
+        uni_name = university_payload["name"]
+
+        uni_info = get_university_by_name(uni_name)
+        if uni_info:
+            uni_id = uni_info.get("id")
+            if self.skip_unchanged and get_manifest().is_unchanged("university", uni_id, university_payload):
+                course_log["status"].append("university_unchanged")
+                self.counts.add("university_skipped", cause="unchanged")
+                return uni_id
+            try:
+                res = get_sink().upsert("university", "update", university_payload, entity_id=uni_id)
+                if res.status_code in [200, 201]:
+                    course_log["status"].append("university_updated")
+                    get_manifest().record("university", uni_id, university_payload)
+                    self.counts.add("university_updated")
+                else:
+                    if res.status_code == 404:
+                        get_cache().invalidate_university(uni_name)
+                    course_log["status"].append(f"university_update_failed_{res.status_code}")
+                    course_log["errorMessage"] = res.text
+                    job.failure = failure_details("university_update", res)
+            except Exception as e:
+                course_log["status"].append("university_update_error")
+                course_log["errorMessage"] = str(e)
+                job.failure = failure_details("university_update", error=str(e))
+            return uni_id
+
+        if self.university_index is not None:
+            found = self.university_index.match(uni_name)
+            if found:
+                # Link to the existing university as is; updating it would rename it to this spelling
+                uni_id, matched_name, score = found
+                print(f"🔎 {self.prefix}'{uni_name}' matched existing '{matched_name}' (score {score})")
+                course_log["status"].append("university_fuzzy_matched")
+                self.counts.add("university_skipped", cause="fuzzy_match")
+                return uni_id
+
+        job.failure = {}
+        uni_info = create_university(university_payload, job.failure)
+        if uni_info:
+            job.failure = None
+            course_log["status"].append("university_created")
+            get_manifest().record("university", uni_info.get("id"), university_payload)
+            self.counts.add("university_created")
+            if self.university_index is not None:
+                self.university_index.add(uni_name, uni_info.get("id"))
+            if self.course_catalog is not None:
+                self.course_catalog.add_university(uni_info.get("id"))
+            return uni_info.get("id")
+        course_log["status"].append("university_creation_failed")
+        course_log["errorMessage"] = f"Could not create university '{uni_name}'"
+        return None
+
+    def _resolve_course(self, job):
+        course_name = job.row.get('Program Name')
+        key = (normalize_name(course_name), job.uni_id)
+        self._courses_inflight.acquire(key)
+        job.course_key = key
+
+        with stage("resolve"):
+            course_id = self.course_catalog.lookup(job.uni_id, course_name) if self.course_catalog else MISS
+            if course_id is MISS:
+                cou_info = get_course_by_name_and_uni_id(course_name, job.uni_id)
+            else:
+                cou_info = {"id": course_id} if course_id is not None else None
+        if cou_info:
+            job.course_id = cou_info.get("id")
+            job.course_log["status"].append("existing")
+            if self.skip_unchanged and get_manifest().is_unchanged("course", job.course_id, job.course_payload):
+                job.course_log["status"].append("unchanged")
+                self.counts.add("course_skipped", cause="unchanged")
+                return self._finish(job)
+        return job
+
+    def _upsert(self, job):
+        course_log = job.course_log
+        course_payload = job.course_payload
+
+        if job.course_id:
+            res = update_course(job.course_id, course_payload, job.row_number)
+            if isinstance(res, dict) and res.get("error"):
+                course_log["status"].append("error_updating")
+                course_log["errorMessage"] = res["error"]
+                job.failure = failure_details("course_update", error=res["error"])
+            elif res.status_code in [200, 201]:
+                course_log["status"].append("updated")
+                get_manifest().record("course", job.course_id, course_payload)
+                self.counts.add("course_updated")
+            else:
+                if res.status_code == 404 and self.course_catalog:
+                    self.course_catalog.forget(job.uni_id, course_payload.get("name"))
+                course_log["status"].append(f"update_failed_{res.status_code}")
+                course_log["errorMessage"] = res.text
+                job.failure = failure_details("course_update", res)
+            return self._finish(job)
+
+        # As for universities: no "not found" entry outlives the create
+        get_cache().invalidate_course(course_payload["name"], job.uni_id)
+        try:
+            res = get_sink().upsert("course", "create", course_payload, row_number=job.row_number)
+            if res.status_code in [200, 201]:
+                course_log["status"].append("created")
+                self.counts.add("course_created")
+                job.course_id = api_client.json_or_empty(res).get("id")
+                if job.course_id:
+                    get_cache().put_course(course_payload["name"], job.uni_id, job.course_id)
+                    get_manifest().record("course", job.course_id, course_payload)
+                    if self.course_catalog:
+                        self.course_catalog.add(job.uni_id, course_payload["name"], job.course_id)
+            else:
+                course_log["status"].append(f"create_failed_{res.status_code}")
+                course_log["errorMessage"] = res.text
+                job.failure = failure_details("course_create", res)
+        except Exception as e:
+            course_log["status"].append("error_creating")
+            course_log["errorMessage"] = str(e)
+            job.failure = failure_details("course_create", error=str(e))
+        return self._finish(job)
+
+    # === Row outcome ===
+
+    def _failure_message(self, job):
+        n = job.row_number
+        statuses = job.course_log["status"]
+        failed = any("failed" in s or "error" in s for s in statuses)
+        if self.schema.failure_style == "course_log":
+            if failed:
+                print(f"{self.prefix}[{n}] failed -> {job.course_log}", end=' , ')
+                return f"[{n}] {job.course_log}"
+            if not job.uni_id:
+                print(f"{self.prefix}[{n}] {job.course_log}")
+            return None
+        if failed:
+            message = f"[{n}] {', '.join(statuses)}"
+        elif not job.uni_id:
+            message = f"[{n}] unknown_university_error"
+        else:
+            return None
+        print(f"\n❌ {self.prefix}{message}")
+        return message
+
+    def _finish(self, job, message=None):
+        # Checkpoint the row's outcome; returns None so the row stops here
+        if job.course_key is not None:
+            self._courses_inflight.release(job.course_key)
+            job.course_key = None
+        message = message or self._failure_message(job)
+        ok = not message and job.uni_id
+        if not ok:
+            self.counts.add("failed", cause=failure_cause(job.course_log["status"], job.uni_id))
+        get_metrics().row_done(
+            job.row_number, ok=bool(ok), statuses=job.course_log["status"], university=job.course_log["university"],
+            uni_id=job.uni_id, course_id=job.course_id, message=message,
+        )
+        if self.journal:
+            self.journal.record(
+                job.row_number, STATUS_OK if ok else STATUS_FAILED,
+                university=job.course_log["university"], uni_id=job.uni_id, course_id=job.course_id, message=message,
+            )
+        if self.dead_letter and not ok:
+            self.dead_letter.record(
+                job.row_number, job.course_log["status"], university=job.university_key or job.course_log["university"],
+                uni_id=job.uni_id,
+                course_id=job.course_id, failure=job.failure, university_payload=job.university_payload,
+                course_payload=job.course_payload, message=message,
+            )
+        if message and self.failed_report is not None:
+            self.failed_report.add(message)
+        with self._lock:
+            if message and self.failed_report is None:
+                self._failed.append((job.row_number, message))
+            self._finished += 1
+            finished = self._finished
+        if finished % PROGRESS_EVERY == 0:
+            self.print_progress()
+        return None
+
+    def print_progress(self):
+        depths = " · ".join(f"{name} {q.qsize()}/{q.maxsize}" for name, q in self.queues.items())
+        print(f"\n🚦 {get_metrics().progress_line()} · queues {depths} · {api_client.limiter_status()}")
+
+    # === Running ===
+
+    def _worker(self, handle, inbox, outbox, remaining, downstream_workers):
+        while True:
+            job = inbox.get()
+            if job is _DONE:
+                break
+            try:
+                job = handle(job)
+            except Exception as e:
+                message = f"[{job.row_number}] unhandled_error: {e}"
+                print(f"\n❌ {self.prefix}{message}")
+                job.course_log["status"].append("unhandled_error")
+                job = self._finish(job, message)
+            if job is not None:
+                outbox.put(job)
+
+        # The last worker of a stage tells every worker of the next one to stop
+        with self._lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last and outbox is not None:
+            for _ in range(downstream_workers):
+                outbox.put(_DONE)
+
+    def run(self, rows):
+        # rows: iterable of (row_number, row) with row["parsed"] filled in.
+        # Returns the failure messages sorted by row number, so failed.txt
+        # looks the same whatever the concurrency (none with a failed_report,
+        # which sorts its file on close instead).
+        handlers = {
+            "build": self._build,
+            "university": self._resolve_university,
+            "course": self._resolve_course,
+            "upsert": self._upsert,
+        }
+        self.queues = {name: queue.Queue(maxsize=self.queue_size) for name in STAGES}
+
+        threads = []
+        for position, name in enumerate(STAGES):
+            downstream = STAGES[position + 1] if position + 1 < len(STAGES) else None
+            remaining = [self.workers[name]]
+            for index in range(self.workers[name]):
+                threads.append(threading.Thread(
+                    target=self._worker, name=f"{name}-{index}", daemon=True,
+                    args=(
+                        handlers[name], self.queues[name], self.queues.get(downstream), remaining,
+                        self.workers[downstream] if downstream else 0,
+                    ),
+                ))
+        for thread in threads:
+            thread.start()
+
+        # Row source: runs in the calling thread and blocks when "build" is full
+        try:
+            for row_number, row in rows:
+                self.queues["build"].put(RowJob(row_number, row))
+        finally:
+            for _ in range(self.workers["build"]):
+                self.queues["build"].put(_DONE)
+            for thread in threads:
+                thread.join()
+
+        return [message for _, message in sorted(self._failed, key=lambda f: f[0])]
+
+
+def add_upload_arguments(parser):
+    # Flags shared by the single-workbook scripts and upload_all.py
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("UPLOAD_WORKERS", 1)),
+                        help="Threads per network stage (university, course, upsert); default $UPLOAD_WORKERS or 1")
+    for name in STAGES:
+        parser.add_argument(f"--{name}-workers", type=int, help=f"Threads for the {name} stage (overrides --workers)")
+    parser.add_argument("--queue-size", type=int, help="Rows buffered between stages (default: 4 x the largest stage)")
+    parser.add_argument("--skip-unchanged", action="store_true",
+                        help="Only send university/course payloads that changed since the last successful upload")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip rows the journal marks as done and reuse the university ids it resolved")
+    parser.add_argument("--fuzzy-match", action="store_true",
+                        help="Prefetch the university list and reuse the closest existing name instead of creating a near-duplicate")
+    parser.add_argument("--course-catalog", action="store_true",
+                        default=os.environ.get("UPLOAD_COURSE_CATALOG", "0") == "1",
+                        help="Fetch each university's course list once instead of checking every course with "
+                             "/courses/check (falls back to the check if the list can't be trusted)")
+    parser.add_argument("--metrics-log", help="JSONL event log path, rewritten each run (default: <workbook>.metrics.jsonl)")
+    parser.add_argument("--shard", type=parse_shard, default=os.environ.get(SHARD_ENV),
+                        help="Only upload the rows of shard i of N (0-based), split by university; "
+                             "default $UPLOAD_SHARD. Combine the outputs with `python shards.py merge`")
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default=os.environ.get("UPLOAD_TRANSPORT", "per-record"),
+                        help="How upserts are sent: one request per record, or batched to the bulk endpoints")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Max upserts per bulk request")
+    parser.add_argument("--batch-wait", type=float, default=BATCH_WAIT,
+                        help="Seconds a partial batch waits for more upserts before it is sent")
+
+
+def stage_workers(args):
+    workers = {"university": args.workers, "course": args.workers, "upsert": args.workers}
+    if args.transport == "bulk":
+        # Each upsert worker waits for its row's batch, so it takes about a batch of them to fill one
+        workers["upsert"] = max(args.workers, args.batch_size)
+    for name in STAGES:
+        if getattr(args, f"{name}_workers"):
+            workers[name] = getattr(args, f"{name}_workers")
+    return workers
+
+
+def load_resume_state(journal_path, universities, counts):
+    # Rows the journal marks as done; preloads the universities it resolved
+    entries = load_journal(journal_path)
+    done = completed_rows(entries)
+    preloaded = resolved_universities(entries)
+    for uni_name, uni_id in preloaded.items():
+        universities.set(uni_name, uni_id)
+    print(f"⏩ Resuming from {journal_path}: {len(done)} rows done, {len(preloaded)} universities preloaded")
+    if done:
+        counts.add("course_skipped", len(done), cause="resume")
+    return done
+
+
+def load_university_index(args):
+    # The prefetched university list for --fuzzy-match, else None
+    if not args.fuzzy_match:
+        return None
+    index = UniversityIndex()
+    if not index.load():
+        print("⚠️ University list incomplete; approximate matching only knows part of it")
+    print(f"📇 {len(index)} known university names for approximate matching")
+    return index
+
+
+def load_course_catalog(args):
+    return CourseCatalog() if args.course_catalog else None
+
+
+def report_total(path, add, start=0, shards=1, done=0):
+    # Passes the rows this run will see to add() (metrics.set_total /
+    # add_total) for the ETA; a shard gets about 1/N of them. Nothing when
+    # the sheet doesn't record its size and isn't cached yet.
+    rows = row_count(path)
+    if rows is not None:
+        add(max(0, (rows - start) // shards - done))
+
+
+def workbook_rows(path, schema, start=0, done=(), shard=None):
+    # Step 1: Stream rows from Excel; row numbers stay 1-based like before.
+    # Rows before `start`, rows the journal has done and other shards' rows are left out.
+    metrics = get_metrics()
+    rows = (
+        (index + 1, row)
+        for index, row in metrics.timed_iter(iter_rows(path, schema.columns), "read")
+        if index >= start and index + 1 not in done and in_shard(row['University'], shard)
+    )
+    # Parse fees/duration/intakes/exams/rankings into row["parsed"]
+    return metrics.timed_iter(parse_rows(rows, schema.parsed_fields), "parse")
+
+
+def print_run_summary(counts, university_index=None, course_catalog=None):
+    api_client.print_retry_summary()
+    get_cache().print_summary()
+    if university_index is not None:
+        university_index.print_summary()
+    if course_catalog is not None:
+        course_catalog.print_summary()
+    metrics = get_metrics()
+    metrics.print_summary()
+    counts.print_summary()
+    metrics.event("summary", **counts.snapshot())
+    metrics.close()
+
+
+def main(schema):
+    parser = argparse.ArgumentParser(description=f"Upload {schema.name} courses from {schema.default_file}")
+    add_upload_arguments(parser)
+    parser.add_argument("--start", type=int, default=0, help="Skip the first N rows of the sheet")
+    parser.add_argument("--file", default=schema.default_file, help=f"Workbook to upload (default: {schema.default_file})")
+    parser.add_argument("--journal", help="Checkpoint journal path (default: <workbook>.journal.jsonl)")
+    args = parser.parse_args()
+    args.journal = args.journal or shard_path(journal_path_for(args.file), args.shard)
+    args.metrics_log = args.metrics_log or shard_path(metrics_log_path_for(args.file), args.shard)
+    start = args.start
+    if args.shard:
+        print(f"🧩 Shard {args.shard[0]}/{args.shard[1]}: only universities that hash to it")
+
+    university_index = load_university_index(args)
+    pipeline = UploadPipeline(schema, workers=stage_workers(args), queue_size=args.queue_size,
+                              skip_unchanged=args.skip_unchanged, university_index=university_index,
+                              course_catalog=load_course_catalog(args))
+    done = load_resume_state(args.journal, pipeline.universities, pipeline.counts) if args.resume else set()
+    pipeline.journal = journal = Journal(args.journal, resume=args.resume)
+    pipeline.failed_report = failed_report = FailureReport(shard_path("failed.txt", args.shard))
+    pipeline.dead_letter = dead_letter = DeadLetter(shard_path(dead_letter_path_for(args.file), args.shard),
+                                                    resume=args.resume, source=args.file)
+    sink = configure_sink(args.transport, batch_size=args.batch_size, max_wait=args.batch_wait)
+
+    metrics = get_metrics()
+    metrics.open_log(args.metrics_log)
+    metrics.event("config", schema=schema.name, file=args.file, workers=pipeline.workers,
+                  transport=args.transport, resume=args.resume, shard=args.shard)
+    # Row total for the ETA, in the background (opening the workbook for its dimensions takes a moment)
+    shards = args.shard[1] if args.shard else 1
+    threading.Thread(
+        target=report_total, args=(args.file, metrics.set_total, start, shards, len(done)), daemon=True,
+    ).start()
+
+    try:
+        pipeline.run(workbook_rows(args.file, schema, start=start, done=done, shard=args.shard))
+    finally:
+        sink.close()
+        journal.close()
+        dead_letter.close()
+        # Failure lines were written as rows failed; this puts them in row order
+        failed_report.close()
+
+    print(f"\n📄 {failed_report.count} failed rows → {failed_report.path}")
+    if dead_letter.written:
+        print(f"📮 {dead_letter.written} failed rows with payloads → {dead_letter.path} (resend: python replay.py {dead_letter.path})")
+    print_run_summary(pipeline.counts, university_index, pipeline.course_catalog)
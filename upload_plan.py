@@ -0,0 +1,416 @@
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_sink import BATCH_SIZE, BATCH_WAIT, TRANSPORTS, UpsertError, configure_sink, get_sink
+from change_manifest import get_manifest
+from course_catalog import CourseCatalog
+from id_cache import MISS, get_cache, normalize_name
+from journal import STATUS_FAILED, STATUS_OK, Journal, completed_rows, load_journal, resolved_universities
+from log_sinks import FailureReport
+from metrics import get_metrics, stage
+from payload_codec import sanitize
+from row_parsers import parse_rows
+from university_index import UniversityIndex, created_university_id, get_university_by_name
+from upload_pipeline import PROGRESS_EVERY, get_course_by_name_and_uni_id, print_run_summary
+from upload_runner import RunCounts
+from upload_schemas import detect_schema
+from workbook_reader import iter_rows, workbook_columns
+
+# Offline plan / apply for the course uploads:
+#
+#   python upload_plan.py plan Education.xlsx CSE.xlsx --out run.plan.jsonl.gz
+#   python upload_plan.py apply run.plan.jsonl.gz --workers 32 --transport bulk
+#   python upload_plan.py apply run.plan.jsonl.gz --resume     # after a crash
+#
+# `plan` reads the workbooks and only looks things up (prefetched university
+# list, ID cache, by-name, per-university course lists); nothing is written
+# to the API. The plan is gzipped JSON lines:
+#
+#   {"plan": 1, "files": [...], "created": ..., "summary": {...}}    header
+#   {"u": <name>, "op": "create"|"update"|"skip", "id": ..., "payload": {...}}
+#   {"c": <n>, "u": <name>, "op": ..., "id": ..., "rows": [[file, row], ...], "payload": {...}}
+#
+# One line per university and per (university, course name): rows that
+# repeat a course are folded into one entry carrying the last row's
+# payload, which is what the row-by-row upload ends up sending last anyway.
+# Course payloads leave universityId out; apply fills it in.
+#
+# `apply` sends every university entry, then streams the course entries,
+# both on a thread pool through batch_sink (so --transport bulk works).
+# Each finished entry goes to <plan>.apply.journal.jsonl; --resume skips
+# what is done and, for creates that may have gone through right before a
+# crash, looks the record up first so a restart never creates it twice.
+
+PLAN_VERSION = 1
+PLAN_SUFFIX = ".plan.jsonl.gz"
+
+
+def plan_path_for(excel_file):
+    return f"{os.path.splitext(excel_file)[0]}{PLAN_SUFFIX}"
+
+
+def _plan_stem(plan_path):
+    return plan_path[:-len(PLAN_SUFFIX)] if plan_path.endswith(PLAN_SUFFIX) else os.path.splitext(plan_path)[0]
+
+
+def read_plan(path):
+    # (header, iterator over the entry lines)
+    f = gzip.open(path, "rt", encoding="utf-8")
+    header = json.loads(f.readline())
+    if header.get("plan") != PLAN_VERSION:
+        f.close()
+        raise ValueError(f"{path} is not a version {PLAN_VERSION} plan")
+
+    def entries():
+        with f:
+            for line in f:
+                yield json.loads(line)
+    return header, entries()
+
+
+# === plan ===
+
+def collect_rows(paths):
+    # universities: name -> first row's payload; courses: (name, course key) -> entry
+    universities = {}
+    courses = {}
+    files = []
+    for path in paths:
+        schema = detect_schema(workbook_columns(path))
+        if schema is None:
+            print(f"⚠️ Skipping {path}: no schema matches its columns")
+            continue
+        file_index = len(files)
+        files.append(path)
+        rows = ((index + 1, row) for index, row in iter_rows(path, schema.columns))
+        for row_number, row in parse_rows(rows, schema.parsed_fields):
+            with stage("build"):
+                key = str(row['University']).strip()
+                universities.setdefault(key, sanitize(schema.university_payload(row)))
+                course_payload = sanitize(schema.course_payload(row))
+                course_payload.pop("universityId", None)
+                entry = courses.setdefault((key, normalize_name(course_payload.get("name"))), {"rows": []})
+                entry["rows"].append([file_index, row_number])
+                entry["payload"] = course_payload
+        print(f"📖 {path} ({schema.name}): {len(universities)} universities, {len(courses)} courses so far")
+    return files, universities, courses
+
+
+def plan_university(name, payload, index, fuzzy, skip_unchanged):
+    # {"op", "id"} for one university, looked up but not written
+    uni_id = index.lookup(name) if index is not None else None
+    if uni_id is None:
+        uni_info = get_university_by_name(name)
+        uni_id = uni_info.get("id") if uni_info else None
+    if uni_id is None and fuzzy and index is not None:
+        found = index.match(name)
+        if found:
+            print(f"🔎 '{name}' matched existing '{found[1]}' (score {found[2]})")
+            return {"op": "skip", "id": found[0], "matched": found[1]}
+    if uni_id is None:
+        return {"op": "create", "id": None}
+    if skip_unchanged and get_manifest().is_unchanged("university", uni_id, payload):
+        return {"op": "skip", "id": uni_id}
+    return {"op": "update", "id": uni_id}
+
+
+def plan_course(uni_id, payload, catalog, skip_unchanged):
+    if uni_id is None:
+        return {"op": "create", "id": None}   # its university is created by apply
+    name = payload.get("name")
+    course_id = catalog.lookup(uni_id, name) if catalog is not None else MISS
+    if course_id is MISS:
+        course_info = get_course_by_name_and_uni_id(name, uni_id)
+        course_id = course_info.get("id") if course_info else None
+    if course_id is None:
+        return {"op": "create", "id": None}
+    if skip_unchanged and get_manifest().is_unchanged("course", course_id, dict(payload, universityId=uni_id)):
+        return {"op": "skip", "id": course_id}
+    return {"op": "update", "id": course_id}
+
+
+def make_plan(paths, out, workers=8, prefetch=True, fuzzy=False, course_catalog=False, skip_unchanged=False):
+    started = time.monotonic()
+    files, universities, courses = collect_rows(paths)
+    if not files:
+        print("❌ No workbooks to plan.")
+        return None
+
+    index = None
+    if prefetch or fuzzy:
+        index = UniversityIndex()
+        if not index.load():
+            print("⚠️ University list incomplete; names it doesn't have fall back to the by-name lookup")
+    catalog = CourseCatalog() if course_catalog else None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        names = list(universities)
+        with stage("resolve"):
+            decisions = dict(zip(names, pool.map(
+                lambda name: plan_university(name, universities[name], index, fuzzy, skip_unchanged), names,
+            )))
+            course_keys = list(courses)
+            course_decisions = dict(zip(course_keys, pool.map(
+                lambda key: plan_course(decisions[key[0]]["id"], courses[key]["payload"], catalog, skip_unchanged),
+                course_keys,
+            )))
+
+    summary = {}
+    for kind, table in (("university", decisions), ("course", course_decisions)):
+        for decision in table.values():
+            summary[f"{kind}_{decision['op']}"] = summary.get(f"{kind}_{decision['op']}", 0) + 1
+
+    with gzip.open(out, "wt", encoding="utf-8", compresslevel=6) as f:
+        header = {"plan": PLAN_VERSION, "files": files, "created": round(time.time(), 3), "summary": summary}
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        for name, payload in universities.items():
+            f.write(json.dumps({"u": name, **decisions[name], "payload": payload}, ensure_ascii=False, default=str) + "\n")
+        for number, key in enumerate(course_keys, 1):
+            entry = {"c": number, "u": key[0], **course_decisions[key], "rows": courses[key]["rows"],
+                     "payload": courses[key]["payload"]}
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    rows = sum(len(entry["rows"]) for entry in courses.values())
+    print(f"\n📝 Plan → {out} ({os.path.getsize(out) / 1024:.0f} KiB, {rows} rows, "
+          f"{time.monotonic() - started:.1f}s)")
+    for kind in ("university", "course"):
+        print(f"   {kind.capitalize()}: " + ", ".join(
+            f"{summary.get(f'{kind}_{op}', 0)} {op}" for op in ("create", "update", "skip")
+        ))
+    writes = sum(count for key, count in summary.items() if not key.endswith("_skip"))
+    print(f"   {writes} writes to apply")
+    if index is not None:
+        index.print_summary()
+    if catalog is not None:
+        catalog.print_summary()
+    return out
+
+
+# === apply ===
+
+class PlanApplier:
+    def __init__(self, plan_path, workers=32, resume=False, course_catalog=False):
+        self.plan_path = plan_path
+        self.workers = workers
+        self.resume = resume
+        stem = _plan_stem(plan_path)
+        self.journal_path = f"{stem}.apply.journal.jsonl"
+        self.failed_path = f"{stem}.apply.failed.txt"
+        self.counts = RunCounts()
+        self.uni_ids = {}
+        self.catalog = CourseCatalog() if course_catalog else None
+        self._lock = threading.Lock()
+        self._finished = 0
+        self._files = []
+
+    def _rows_label(self, entry):
+        rows = entry.get("rows")
+        if not rows:
+            return entry["u"]
+        return " ".join(f"{os.path.basename(self._files[file_index])}:{row}" for file_index, row in rows)
+
+    def _finish(self, key, entry, ok, status, uni_id=None, course_id=None, message=None):
+        self.journal.record(key, STATUS_OK if ok else STATUS_FAILED, university=entry["u"], uni_id=uni_id,
+                            course_id=course_id, message=message)
+        metrics = get_metrics()
+        metrics.row_done(key, ok=ok, statuses=[status])
+        with self._lock:
+            if not ok:
+                self.counts.add("failed", cause=status)
+                self.failed_report.add(f"[{self._rows_label(entry)}] {status}" + (f" {message}" if message else ""))
+            self._finished += 1
+            if self._finished % PROGRESS_EVERY == 0:
+                print(f"🚦 {metrics.progress_line()}")
+
+    def _send(self, kind, op, payload, entity_id):
+        # (response, error status) through batch_sink
+        try:
+            res = get_sink().upsert(kind, op, payload, entity_id=entity_id)
+        except UpsertError as e:
+            return None, f"{op}_error: {e}"
+        if res.status_code in [200, 201]:
+            return res, None
+        return res, f"{op}_failed_{res.status_code}"
+
+    def apply_university(self, entry):
+        key = f"u:{entry['u']}"
+        op, uni_id, payload = entry["op"], entry.get("id"), entry["payload"]
+        if op == "create" and self.resume:
+            # The create may have gone through right before a crash; ask the
+            # API, not the plan's cached "not found"
+            get_cache().invalidate_university(entry["u"])
+            found = get_university_by_name(entry["u"])
+            if found:
+                op, uni_id = "update", found.get("id")
+        if op == "create":
+            # No "not found" may outlive a create that is in flight (id_cache)
+            get_cache().invalidate_university(payload.get("name", entry["u"]))
+        with stage("upsert"):
+            res, error = self._send("university", op, payload, uni_id)
+        if error:
+            return self._finish(key, entry, False, f"university_{error}", message=res.text if res else None)
+        if op == "create":
+            uni_id = created_university_id(payload.get("name", entry["u"]), res.json().get("id"))
+            if uni_id is None:
+                return self._finish(key, entry, False, "university_create_no_id", message=res.text)
+        else:
+            get_cache().put_university(payload.get("name", entry["u"]), uni_id)
+        with self._lock:
+            self.uni_ids[entry["u"]] = uni_id
+        get_manifest().record("university", uni_id, payload)
+        if op == "create" and self.catalog is not None:
+            self.catalog.add_university(uni_id)
+        self.counts.add(f"university_{op}d")
+        self._finish(key, entry, True, f"university_{op}d", uni_id=uni_id)
+
+    def apply_course(self, entry):
+        key = f"c:{entry['c']}"
+        uni_id = self.uni_ids.get(entry["u"])
+        if not uni_id:
+            return self._finish(key, entry, False, "university_unavailable")
+        op, course_id = entry["op"], entry.get("id")
+        payload = dict(entry["payload"], universityId=uni_id)
+        if op == "create" and self.resume:
+            found = self.catalog.lookup(uni_id, payload.get("name")) if self.catalog is not None else MISS
+            if found is MISS:
+                get_cache().invalidate_course(payload.get("name"), uni_id)
+                info = get_course_by_name_and_uni_id(payload.get("name"), uni_id)
+                found = info.get("id") if info else None
+            if found:
+                op, course_id = "update", found
+        if op == "create":
+            get_cache().invalidate_course(payload.get("name"), uni_id)
+        with stage("upsert"):
+            res, error = self._send("course", op, payload, course_id)
+        if error:
+            return self._finish(key, entry, False, error, uni_id=uni_id, message=res.text if res else None)
+        course_id = course_id or res.json().get("id")
+        if course_id:
+            get_cache().put_course(payload.get("name"), uni_id, course_id)
+            get_manifest().record("course", course_id, payload)
+        self.counts.add(f"course_{op}d")
+        self._finish(key, entry, True, f"{op}d", uni_id=uni_id, course_id=course_id)
+
+    def _guarded(self, apply, entry, key):
+        try:
+            apply(entry)
+        except Exception as e:
+            self._finish(key, entry, False, "unhandled_error", message=str(e))
+
+    def run(self):
+        header, entries = read_plan(self.plan_path)
+        self._files = header.get("files", [])
+        done = set()
+        if self.resume:
+            journal_entries = load_journal(self.journal_path)
+            done = completed_rows(journal_entries)
+            self.uni_ids.update(resolved_universities(journal_entries))
+            print(f"⏩ Resuming from {self.journal_path}: {len(done)} entries done")
+            if done:
+                self.counts.add("course_skipped", len([key for key in done if key.startswith("c:")]), cause="resume")
+        self.journal = Journal(self.journal_path, resume=self.resume)
+        # Lines start with "[<file>:<row> ...]", so plain text order groups them by file
+        self.failed_report = FailureReport(self.failed_path, sort_key=None)
+
+        summary = header.get("summary", {})
+        total = sum(count for op, count in summary.items() if not op.endswith("_skip"))
+        get_metrics().set_total(max(0, total - len(done)))
+        for op, count in summary.items():
+            if op.endswith("_skip"):
+                self.counts.add(f"{op.split('_')[0]}_skipped", count, cause="plan")
+
+        in_flight = threading.BoundedSemaphore(self.workers * 4)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                # Universities first: courses need their ids
+                university_jobs = []
+                for entry in entries:
+                    if "c" in entry:
+                        first_course = entry
+                        break
+                    if entry.get("id") is not None:
+                        self.uni_ids.setdefault(entry["u"], entry["id"])
+                    if entry["op"] == "skip" or f"u:{entry['u']}" in done:
+                        continue
+                    university_jobs.append(pool.submit(self._guarded, self.apply_university, entry, f"u:{entry['u']}"))
+                else:
+                    first_course = None
+                for job in university_jobs:
+                    job.result()
+
+                # Then the courses, streamed from the plan a bounded number at a time
+                def submit(entry):
+                    key = f"c:{entry['c']}"
+                    if entry["op"] == "skip" or key in done:
+                        return
+                    in_flight.acquire()
+                    pool.submit(self._guarded, self.apply_course, entry, key).add_done_callback(
+                        lambda _: in_flight.release())
+
+                if first_course is not None:
+                    submit(first_course)
+                    for entry in entries:
+                        submit(entry)
+        finally:
+            get_sink().close()
+            self.journal.close()
+            self.failed_report.close()
+
+        print(f"\n📄 {self.failed_report.count} failed entries → {self.failed_path}")
+        print_run_summary(self.counts, course_catalog=self.catalog)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan an upload offline, then apply the plan")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="Read workbooks and write a plan; nothing is written to the API")
+    plan.add_argument("workbooks", nargs="+")
+    plan.add_argument("--out", help=f"Plan file (default: <first workbook>{PLAN_SUFFIX})")
+    plan.add_argument("--workers", type=int, default=int(os.environ.get("UPLOAD_WORKERS", 8)), help="Lookup threads")
+    plan.add_argument("--no-prefetch", action="store_true", help="Don't prefetch the university list")
+    plan.add_argument("--fuzzy-match", action="store_true",
+                      help="Plan unknown names that closely match an existing university as that university")
+    plan.add_argument("--course-catalog", action="store_true",
+                      help="Fetch each university's course list once instead of checking each course with /courses/check")
+    plan.add_argument("--skip-unchanged", action="store_true",
+                      help="Plan records whose payload matches the last upload as skips")
+
+    apply = commands.add_parser("apply", help="Send a plan's creates and updates")
+    apply.add_argument("plan")
+    apply.add_argument("--workers", type=int, default=int(os.environ.get("UPLOAD_WORKERS", 32)), help="Sending threads")
+    apply.add_argument("--resume", action="store_true", help="Skip entries the apply journal marks as done")
+    apply.add_argument("--course-catalog", action="store_true",
+                       help="On --resume, look for already-created courses in each university's course list "
+                            "instead of with /courses/check")
+    apply.add_argument("--transport", choices=sorted(TRANSPORTS), default=os.environ.get("UPLOAD_TRANSPORT", "per-record"))
+    apply.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Max upserts per bulk request")
+    apply.add_argument("--batch-wait", type=float, default=BATCH_WAIT,
+                       help="Seconds a partial batch waits for more upserts before it is sent")
+    apply.add_argument("--metrics-log", help="JSONL event log path, rewritten each run (default: <plan>.apply.metrics.jsonl)")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        make_plan(args.workbooks, args.out or plan_path_for(args.workbooks[0]), workers=args.workers,
+                  prefetch=not args.no_prefetch, fuzzy=args.fuzzy_match,
+                  course_catalog=args.course_catalog, skip_unchanged=args.skip_unchanged)
+        return
+
+    configure_sink(args.transport, batch_size=args.batch_size, max_wait=args.batch_wait)
+    workers = args.workers
+    if args.transport == "bulk":
+        # Each sending thread waits for its entry's batch, so it takes about a batch of them to fill one
+        workers = max(workers, args.batch_size)
+    metrics = get_metrics()
+    metrics.open_log(args.metrics_log or f"{_plan_stem(args.plan)}.apply.metrics.jsonl")
+    metrics.event("config", plan=args.plan, workers=workers, transport=args.transport, resume=args.resume)
+    PlanApplier(args.plan, workers=workers, resume=args.resume, course_catalog=args.course_catalog).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import threading
+
+
+class SingleFlightResolver:
+    # Thread-safe name -> id map where each key is resolved by at most one
+    # caller at a time. Concurrent callers for the same key wait for the
+    # in-flight call instead of issuing their own (so two workers never both
+    # create the same university). Failed resolutions (None) are not stored,
+    # so the next caller retries exactly like the serial loop did.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._inflight = {}
+
+    def get(self, key):
+        with self._lock:
+            return self._values.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+    def resolve(self, key, resolve_fn):
+        while True:
+            with self._lock:
+                if key in self._values:
+                    return self._values[key]
+                event = self._inflight.get(key)
+                leader = event is None
+                if leader:
+                    event = self._inflight[key] = threading.Event()
+
+            if not leader:
+                event.wait()
+                continue
+
+            value = None
+            try:
+                value = resolve_fn()
+            finally:
+                with self._lock:
+                    if value:
+                        self._values[key] = value
+                    del self._inflight[key]
+                event.set()
+            return value
+
+    def __len__(self):
+        with self._lock:
+            return len(self._values)
+
+
+class RunCounts:
+    # Thread-safe tally of created / updated / skipped / failed outcomes,
+    # optionally broken down by cause (e.g. failed -> create_failed_500)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._causes = {}
+
+    def add(self, key, n=1, cause=None):
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + n
+            if cause:
+                causes = self._causes.setdefault(key, {})
+                causes[cause] = causes.get(cause, 0) + n
+
+    def get(self, key):
+        with self._lock:
+            return self._counts.get(key, 0)
+
+    def causes(self, key):
+        with self._lock:
+            return dict(self._causes.get(key, {}))
+
+    def merge(self, other):
+        # Adds another tally's counts and causes to this one
+        snap = other.snapshot()
+        with self._lock:
+            for key, n in snap["counts"].items():
+                self._counts[key] = self._counts.get(key, 0) + n
+            for key, causes in snap["causes"].items():
+                mine = self._causes.setdefault(key, {})
+                for cause, n in causes.items():
+                    mine[cause] = mine.get(cause, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return {"counts": dict(self._counts), "causes": {key: dict(c) for key, c in self._causes.items()}}
+
+    def _with_causes(self, key):
+        causes = self.causes(key)
+        if not causes:
+            return str(self.get(key))
+        ordered = sorted(causes.items(), key=lambda c: -c[1])
+        return f"{self.get(key)} (" + ", ".join(f"{cause}: {n}" for cause, n in ordered) + ")"
+
+    def print_summary(self):
+        def line(kind):
+            return (f"{self._with_causes(kind + '_created')} created, {self._with_causes(kind + '_updated')} updated, "
+                    f"{self._with_causes(kind + '_skipped')} skipped")
+        print(f"\n📊 Universities: {line('university')}")
+        print(f"📊 Courses: {line('course')}")
+        print(f"📊 Failed rows: {self._with_causes('failed')}")
+
+
+def failure_cause(statuses, uni_id):
+    # The first failed/error status of a row, for the per-cause summary
+    for status in statuses:
+        if "failed" in status or "error" in status:
+            return status
+    return "unknown_university_error" if not uni_id else "failed"
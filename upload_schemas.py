@@ -0,0 +1,142 @@
+import pandas as pd
+
+# Declarative column mappings for upload_pipeline. A schema says which
+# workbook columns are read, which parse steps fill row["parsed"]
+# (row_parsers.parse_rows) and how each university / course payload key is filled
+# from a row:
+#
+#   text(col)         stripped string, '-' (or the given fallback) when empty
+#   cell(col)         the raw cell value
+#   parsed(field)     a value row_parsers put in row["parsed"]
+#   const(value)      a fixed value
+#   UNIVERSITY_ID     the id the university stage resolved
+
+
+def text(column, fallback='-'):
+    def get(row):
+        value = row.get(column)
+        return str(value).strip() if pd.notna(value) else fallback
+    return get
+
+
+def cell(column):
+    return lambda row: row.get(column)
+
+
+def parsed(field):
+    return lambda row: row["parsed"][field]
+
+
+def const(value):
+    return lambda row: value
+
+
+UNIVERSITY_ID = object()
+
+
+class Schema:
+    def __init__(self, name, default_file, columns, parsed_fields, university, course, failure_style="statuses",
+                 signature=()):
+        self.name = name
+        self.default_file = default_file
+        self.columns = columns
+        self.parsed_fields = parsed_fields
+        self.university = university
+        self.course = course
+        # How failed.txt lines look: "statuses" -> "[12] create_failed_500",
+        # "course_log" -> "[12] {'course': ..., 'status': [...], ...}"
+        self.failure_style = failure_style
+        # Header columns that identify a workbook of this kind (detect_schema)
+        self.signature = signature
+
+    def university_payload(self, row):
+        return {key: get(row) for key, get in self.university.items()}
+
+    def course_payload(self, row):
+        # universityId is filled in once the university is resolved
+        return {key: None if get is UNIVERSITY_ID else get(row) for key, get in self.course.items()}
+
+
+# Columns shared by both course sheets
+_COURSE_FIELDS = {
+    "name": cell('Program Name'),
+    "requirements": cell('Entry Requirements'),
+    "description": const(None),
+    "fees": parsed("fees"),
+    "feesCurrency": parsed("feesCurrency"),
+    "intakeMonths": parsed("intakeMonths"),
+    "feesRange": parsed("feesRange"),
+    "universityId": UNIVERSITY_ID,
+    "levelName": cell('Study Level'),
+    "durationLabel": parsed("durationLabel"),
+    "durationValue": parsed("durationValue"),
+    "examAccepted": parsed("examAccepted"),
+    "scholarship": cell("Scholarship Detail"),
+}
+
+
+# KC Overseas exports (Education.xlsx, CSE.xlsx, Commerce.xlsx): rankings
+# come as one multi-line 'University Ranking' text cell
+KC_COURSES = Schema(
+    name="KC Overseas",
+    default_file='Education.xlsx',
+    columns=[
+        'University', 'University Ranking', 'Website URL', 'Campus', 'Country',
+        'Program Name', 'Study Level', 'Duration', 'Open Intakes', 'Entry Requirements',
+        'IELTS Score', 'TOEFL Score', 'PTE Score', 'Yearly Tuition Fees', 'Scholarship Detail',
+    ],
+    parsed_fields=["fees", "duration", "intakes", "exams", "ranking_text"],
+    university={
+        "name": text('University'),
+        "website": text('Website URL', None),
+        "countryName": text('Country'),
+        "stateName": const('-'),
+        "cityName": text('Campus'),
+        "ranking": parsed("ranking"),
+    },
+    course=_COURSE_FIELDS,
+    failure_style="statuses",
+    signature=['University', 'Program Name', 'University Ranking'],
+)
+
+
+# StudyReach export: QS / THE rankings in separate columns, a logo, and a
+# post-study work visa column
+STUDYREACH_COURSES = Schema(
+    name="StudyReach",
+    default_file='studyreach_unique_courses_filtered_.xlsx',
+    columns=[
+        'University', 'logo', 'Campus', 'Country', 'QS  Ranking', 'The World Ranking',
+        'Program Name', 'Study Level', 'Duration', 'Open Intakes', 'Entry Requirements',
+        'IELTS Score', 'TOEFL Score', 'PTE Score', 'Yearly Tuition Fees', 'Scholarship Detail',
+        'Work Visa Permit',
+    ],
+    parsed_fields=["fees", "duration", "intakes", "exams", "work_visa", "split_ranking"],
+    university={
+        "name": text('University'),
+        "logo": text('logo', None),
+        "website": const(None),
+        "countryName": text('Country'),
+        "stateName": const('-'),
+        "cityName": text('Campus'),
+        "ranking": parsed("ranking"),
+    },
+    course={
+        **_COURSE_FIELDS,
+        "workVisaPermitLabel": parsed("workVisaPermitLabel"),
+        "workVisaPermitValue": parsed("workVisaPermitValue"),
+    },
+    failure_style="course_log",
+    signature=['University', 'Program Name', 'QS  Ranking'],
+)
+
+
+SCHEMAS = [KC_COURSES, STUDYREACH_COURSES]
+
+
+def detect_schema(columns):
+    # The schema whose signature columns are all in the header, or None
+    for schema in SCHEMAS:
+        if all(column in columns for column in schema.signature):
+            return schema
+    return None
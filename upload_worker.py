@@ -0,0 +1,419 @@
+import argparse
+import glob
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import Commission_Upload
+from api_client import BASE_URL
+from batch_sink import configure_sink
+from dead_letter import DeadLetter, dead_letter_path_for
+from journal import Journal, journal_path_for
+from log_sinks import FailureReport
+from metrics import get_metrics
+from shards import shard_path
+from university_index import UniversityIndex
+from upload_all import failed_report_path
+from upload_pipeline import (
+    UploadPipeline, add_upload_arguments, load_course_catalog, load_resume_state, load_university_index,
+    print_run_summary, report_total, stage_workers, workbook_rows,
+)
+from upload_runner import RunCounts, SingleFlightResolver
+from upload_schemas import KC_COURSES, SCHEMAS, STUDYREACH_COURSES, detect_schema
+from workbook_reader import workbook_columns
+
+# Long-running upload worker: one process that keeps its HTTP connection
+# pool, ID cache, university resolver / index and course catalog warm and
+# takes jobs from a directory, instead of a fresh one-shot script (pandas
+# import, cold connections, empty caches) per upload:
+#
+#   python upload_worker.py run --jobs jobs --workers 8 [--concurrency 2]
+#   python upload_worker.py submit CSE.xlsx --jobs jobs [--schema kc] [--resume]
+#
+# A job is a JSON file in the jobs directory:
+#
+#   {"file": "CSE.xlsx", "schema": "kc", "target": "https://dev.api.infigon.app/", "resume": false}
+#
+#   schema   kc, studyreach or commission; left out, it is detected from the header
+#            (a sheet with only a University column, plus the job's
+#            company_column, is a commission job)
+#   target   optional; must be this worker's UPLOAD_BASE_URL (a worker talks to one API)
+#   commission jobs also take "companies", "company_column", "log" and "fuzzy"
+#   (see Commission_Upload.py)
+#
+# A worker claims a job by renaming it to <job>.json.<host>-<pid>.running
+# (atomic, so several workers can share a directory) and moves it to done/ or
+# failed/ with a "result" added when it finishes. Upload jobs write the same
+# per-workbook journal, dead letters and <workbook>.failed.txt as
+# upload_all.py. A job left .running by a worker that died is put back, with
+# resume on, when a worker starts on the same host.
+#
+# The upload flags (--workers, --transport, --skip-unchanged, --fuzzy-match,
+# ...) are the worker's and apply to all of its jobs. The university
+# resolver, index and course catalog are rebuilt between jobs once they are
+# --refresh-after seconds old, so changes made outside the worker show up.
+# SIGTERM / Ctrl-C stops claiming jobs and lets the running ones finish; a
+# second one exits at once (the journal lets the job resume).
+
+JOB_SUFFIX = ".json"
+RUNNING_SUFFIX = ".running"
+SCHEMA_NAMES = {"kc": KC_COURSES, "studyreach": STUDYREACH_COURSES, **{schema.name: schema for schema in SCHEMAS}}
+COMMISSION = "commission"
+
+
+class JobError(Exception):
+    pass
+
+
+# === Job directory ===
+
+class JobQueue:
+    def __init__(self, directory):
+        self.directory = directory
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+        for sub in ("", "done", "failed"):
+            os.makedirs(os.path.join(directory, sub), exist_ok=True)
+
+    def submit(self, job, name=None):
+        # Written under a dot-name first, so a worker never reads half a job
+        name = name or f"{time.time_ns()}-{os.path.splitext(os.path.basename(job.get('file', 'job')))[0]}"
+        path = os.path.join(self.directory, name + JOB_SUFFIX)
+        tmp = os.path.join(self.directory, f".{name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        return path
+
+    def pending(self):
+        # Oldest first: submit() names start with a timestamp
+        return sorted(glob.glob(os.path.join(glob.escape(self.directory), "*" + JOB_SUFFIX)))
+
+    def claim(self, busy_files=()):
+        # (claimed path, job) of the next job, or None. Jobs for a workbook a
+        # running job is uploading wait, as they would share its journal.
+        for path in self.pending():
+            claimed = f"{path}.{self.owner}{RUNNING_SUFFIX}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue   # another worker took it
+            with open(claimed, encoding="utf-8") as f:
+                raw = f.read()
+            try:
+                job = json.loads(raw)
+                if not isinstance(job, dict):
+                    raise ValueError("a job must be a JSON object")
+            except ValueError as e:
+                self.finish(claimed, {"raw": raw}, {"status": "failed", "error": f"bad job file: {e}"})
+                continue
+            if os.path.abspath(str(job.get("file"))) in busy_files:
+                os.rename(claimed, path)
+                continue
+            return claimed, job
+        return None
+
+    def finish(self, claimed, job, result):
+        name = job_name(claimed) + JOB_SUFFIX
+        folder = "done" if result.get("status") == "done" else "failed"
+        out = os.path.join(self.directory, folder, name)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump({**job, "result": result}, f, ensure_ascii=False, indent=2, default=str)
+        os.remove(claimed)
+        return out
+
+    def requeue_stale(self):
+        # Jobs this host's dead workers left running go back in the queue, with resume on
+        host = socket.gethostname()
+        for claimed in glob.glob(os.path.join(glob.escape(self.directory), "*" + JOB_SUFFIX + ".*" + RUNNING_SUFFIX)):
+            name = job_name(claimed)
+            owner = os.path.basename(claimed)[len(name + JOB_SUFFIX) + 1:-len(RUNNING_SUFFIX)]
+            owner_host, _, pid = owner.rpartition("-")
+            if owner_host != host or not pid.isdigit() or _alive(int(pid)):
+                continue
+            with open(claimed, encoding="utf-8") as f:
+                job = json.load(f)
+            job["resume"] = True
+            self.submit(job, name=name)
+            os.remove(claimed)
+            print(f"♻️ Re-queued {name}{JOB_SUFFIX} (left running by {owner}) with resume on")
+
+
+def job_name(claimed):
+    # jobs/123-CSE.json.<host>-<pid>.running -> 123-CSE
+    return os.path.basename(claimed).split(JOB_SUFFIX + ".", 1)[0]
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        return False   # a previous run in this container had our pid; nothing is claimed yet
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# === Warm state ===
+
+class WarmState:
+    # The resolver, university index and course catalog shared by the jobs,
+    # rebuilt when a job starts after they're `refresh_after` seconds old.
+    # Jobs already running keep the ones they started with.
+    def __init__(self, args, refresh_after):
+        self.args = args
+        self.refresh_after = refresh_after
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self.universities = self.university_index = self.course_catalog = None
+        self._commission_index = None
+
+    def current(self):
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_after:
+                if self._loaded_at is not None:
+                    print(f"🔄 Warm caches older than {self.refresh_after:.0f}s; rebuilding")
+                self.universities = SingleFlightResolver()
+                self.university_index = load_university_index(self.args)
+                self.course_catalog = load_course_catalog(self.args)
+                self._commission_index = None
+                self._loaded_at = time.monotonic()
+            return self.universities, self.university_index, self.course_catalog
+
+    def commission_index(self):
+        # The prefetched list Commission_Upload resolves names with (the same one --fuzzy-match loads)
+        _, index, _ = self.current()
+        with self._lock:
+            if index is None and self._commission_index is None:
+                self._commission_index = UniversityIndex()
+                if not self._commission_index.load():
+                    print("⚠️ University list incomplete; names it doesn't have fall back to the by-name lookup")
+            return index or self._commission_index
+
+
+# === Jobs ===
+
+def job_schema(job):
+    name = job.get("schema")
+    if name == COMMISSION:
+        return COMMISSION
+    if name:
+        if name not in SCHEMA_NAMES:
+            raise JobError(f"unknown schema {name!r} (use {', '.join(sorted(SCHEMA_NAMES))} or {COMMISSION})")
+        return SCHEMA_NAMES[name]
+    columns = workbook_columns(job["file"])
+    schema = detect_schema(columns)
+    if schema is not None:
+        return schema
+    # Commission_Upload's input, e.g. CombinedUniversities.xlsx
+    if "University" in columns and set(columns) <= {"University", job.get("company_column")}:
+        return COMMISSION
+    raise JobError("no schema matches the workbook's columns; set \"schema\" in the job")
+
+
+def check_job(job):
+    if not job.get("file"):
+        raise JobError("job has no \"file\"")
+    if not os.path.exists(job["file"]):
+        raise JobError(f"{job['file']} not found")
+    target = job.get("target")
+    if target and target.rstrip("/") != BASE_URL.rstrip("/"):
+        raise JobError(f"job targets {target} but this worker uploads to {BASE_URL}; "
+                       f"run a worker with UPLOAD_BASE_URL={target} for it")
+
+
+def run_upload_job(job, schema, warm, args, totals):
+    path = job["file"]
+    resume = bool(job.get("resume"))
+    universities, university_index, course_catalog = warm.current()
+    counts = RunCounts()
+    journal_path = shard_path(journal_path_for(path), args.shard)
+    done = load_resume_state(journal_path, universities, counts) if resume else set()
+    pipeline = UploadPipeline(
+        schema, workers=stage_workers(args), queue_size=args.queue_size, skip_unchanged=args.skip_unchanged,
+        journal=Journal(journal_path, resume=resume), universities=universities, counts=counts,
+        label=os.path.basename(path), university_index=university_index, course_catalog=course_catalog,
+        dead_letter=DeadLetter(shard_path(dead_letter_path_for(path), args.shard), resume=resume, source=path),
+        failed_report=FailureReport(failed_report_path(path, args.shard)),
+    )
+    shards = args.shard[1] if args.shard else 1
+    threading.Thread(
+        target=report_total, args=(path, get_metrics().add_total, 0, shards, len(done)), daemon=True,
+    ).start()
+    try:
+        pipeline.run(workbook_rows(path, schema, done=done, shard=args.shard))
+    finally:
+        pipeline.journal.close()
+        pipeline.dead_letter.close()
+        pipeline.failed_report.close()
+
+    counts.print_summary()
+    totals.merge(counts)
+    result = {
+        "schema": schema.name,
+        "counts": counts.snapshot()["counts"],
+        "failedRows": pipeline.failed_report.count,
+        "failedReport": pipeline.failed_report.path,
+        "journal": journal_path,
+    }
+    if pipeline.dead_letter.written:
+        result["deadLetters"] = pipeline.dead_letter.path
+    return result
+
+
+def run_commission_job(job, warm, args):
+    company_ids = Commission_Upload.company_ids
+    companies = job.get("companies") or ["KC Overseas"]
+    if companies == "all":
+        companies = sorted(company_ids)
+    log = Commission_Upload.map_universities_to_companies(
+        job["file"], companies, company_ids, warm.commission_index(), fuzzy=bool(job.get("fuzzy")),
+        company_column=job.get("company_column"), workers=job.get("workers") or max(args.workers, 8),
+        output_file=job.get("log"),
+    )
+    if log is None:
+        raise JobError("nothing was linked; see the messages above")
+    return {"schema": COMMISSION, "log": log}
+
+
+def execute(name, job, warm, args, totals):
+    metrics = get_metrics()
+    started = time.monotonic()
+    metrics.event("job_start", job=name, spec=job)
+    try:
+        check_job(job)
+        schema = job_schema(job)
+        print(f"\n📥 {name}: {job['file']} ({schema if schema == COMMISSION else schema.name})")
+        if schema == COMMISSION:
+            result = run_commission_job(job, warm, args)
+        else:
+            result = run_upload_job(job, schema, warm, args, totals)
+        result["status"] = "done"
+    except Exception as e:
+        result = {"status": "failed", "error": str(e) if isinstance(e, JobError) else f"{type(e).__name__}: {e}"}
+    result["seconds"] = round(time.monotonic() - started, 2)
+    metrics.event("job_end", job=name, **result)
+    if result["status"] == "done":
+        print(f"✅ {name} done in {result['seconds']}s")
+    else:
+        print(f"❌ {name} failed after {result['seconds']}s: {result['error']}")
+    return result
+
+
+# === Worker ===
+
+def serve(args):
+    jobs = JobQueue(args.jobs)
+    jobs.requeue_stale()
+    for path in args.workbooks:
+        print(f"📨 Queued {jobs.submit({'file': path, 'resume': args.resume})}")
+
+    sink = configure_sink(args.transport, batch_size=args.batch_size, max_wait=args.batch_wait)
+    metrics = get_metrics()
+    metrics.open_log(args.metrics_log or shard_path("upload_worker.metrics.jsonl", args.shard))
+    metrics.event("config", jobs=args.jobs, workers=stage_workers(args), transport=args.transport,
+                  concurrency=args.concurrency, shard=args.shard, target=BASE_URL)
+    warm = WarmState(args, args.refresh_after)
+    warm.current()   # index / catalog loaded before the first job arrives
+    totals = RunCounts()
+
+    stop = threading.Event()
+
+    def on_signal(signum, frame):
+        if stop.is_set():
+            print("\n🛑 Second signal; exiting now (running jobs resume from their journals)")
+            os._exit(130)
+        print("\n🛑 Stopping: no new jobs; waiting for the running ones (signal again to exit now)")
+        stop.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    lock = threading.Lock()
+    running = {}   # abspath of the workbook -> job name
+
+    def work(claimed, job):
+        name = job_name(claimed)
+        try:
+            result = execute(name, job, warm, args, totals)
+            print(f"🗂️ {name} → {jobs.finish(claimed, job, result)}")
+        finally:
+            with lock:
+                running.pop(os.path.abspath(str(job.get("file"))), None)
+            slots.release()
+
+    print(f"👷 Worker {jobs.owner} watching {args.jobs}/ for jobs (uploading to {BASE_URL}, "
+          f"up to {args.concurrency} at a time)")
+    slots = threading.BoundedSemaphore(args.concurrency)
+    pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="job")
+    while not stop.is_set():
+        if not slots.acquire(timeout=args.poll):
+            continue
+        with lock:
+            claimed = jobs.claim(busy_files=set(running))
+            if claimed is not None:
+                running[os.path.abspath(str(claimed[1].get("file")))] = claimed[0]
+            idle = not running
+        if claimed is None:
+            slots.release()
+            if args.once and idle:
+                break
+            stop.wait(args.poll)
+            continue
+        pool.submit(work, *claimed)
+
+    pool.shutdown(wait=True)
+    sink.close()
+    print_run_summary(totals, warm.university_index, warm.course_catalog)
+
+
+def submit(args):
+    jobs = JobQueue(args.jobs)
+    for path in args.workbooks:
+        job = {"file": path, "resume": args.resume}
+        if args.schema:
+            job["schema"] = args.schema
+        if args.target:
+            job["target"] = args.target
+        if args.company:
+            job["companies"] = args.company
+        print(f"📨 Queued {jobs.submit(job)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running upload worker that takes jobs from a directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Process jobs from the jobs directory until stopped")
+    run.add_argument("workbooks", nargs="*", help="Workbooks to queue as jobs on start")
+    run.add_argument("--jobs", default=os.environ.get("UPLOAD_JOBS_DIR", "jobs"), help="Jobs directory (default: jobs)")
+    run.add_argument("--concurrency", type=int, default=1, help="Jobs processed at the same time")
+    run.add_argument("--poll", type=float, default=2.0, help="Seconds between looks at the jobs directory")
+    run.add_argument("--refresh-after", type=float, default=900.0,
+                     help="Rebuild the university resolver / index / course catalog between jobs after this many seconds")
+    run.add_argument("--once", action="store_true", help="Exit when the jobs directory is empty instead of waiting")
+    add_upload_arguments(run)
+
+    queue_job = commands.add_parser("submit", help="Queue workbooks as jobs")
+    queue_job.add_argument("workbooks", nargs="+")
+    queue_job.add_argument("--jobs", default=os.environ.get("UPLOAD_JOBS_DIR", "jobs"), help="Jobs directory (default: jobs)")
+    queue_job.add_argument("--schema", choices=sorted(["kc", "studyreach", COMMISSION]), help="Default: detect from the header")
+    queue_job.add_argument("--target", help="API base URL the job is meant for (checked by the worker)")
+    queue_job.add_argument("--resume", action="store_true", help="Skip rows the workbook's journal marks as done")
+    queue_job.add_argument("--company", action="append", choices=sorted(Commission_Upload.company_ids),
+                           help="Companies for a commission job; repeat for several (default: KC Overseas)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        serve(args)
+    else:
+        submit(args)
+
+
+if __name__ == "__main__":
+    main()
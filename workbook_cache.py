@@ -0,0 +1,254 @@
+import datetime
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+
+# On-disk copy of each workbook sheet, so only the first run after a
+# workbook changes pays for openpyxl:
+#
+#   .workbook_cache/Commerce-<sha256 prefix>-<sheet>.jsonl
+#
+# Entries are keyed by the file's content hash and the sheet, so an edited
+# workbook simply misses and is read (and cached) again; older entries of the
+# same workbook are removed when the new one is written. The cached cells are
+# the values openpyxl returned, up to the last non-blank row; workbook_reader
+# rebuilds the same records from them.
+#
+# The file is JSON lines, written while openpyxl streams the sheet and read
+# back the same way, a batch at a time:
+#
+#   {"version": 2, "header": <column>}
+#   {"rows": 1000, "columns": [<column>, ...]}      one line per BATCH_ROWS rows
+#   {"end": true, "rows": 19201}
+#
+# A <column> is a plain JSON list when every cell is null, text, a number or
+# a bool (JSON keeps 100 and 99.5 apart, so no cell changes type). A column
+# holding anything else (dates, times) is {"values": [...], "tags": "..."}:
+# every cell as a string plus one type tag per cell (CELL_TAGS).
+#
+# The entry is written to a temp file and renamed once the end line is in,
+# so a reader never sees a partial sheet, and header / row count come from
+# the first and last lines without reading the rows. UPLOAD_WORKBOOK_CACHE=0
+# turns the cache off.
+
+CACHE_DIR = os.environ.get("UPLOAD_WORKBOOK_CACHE", ".workbook_cache")
+FORMAT_VERSION = 2
+BATCH_ROWS = 1000
+JSON_TYPES = (str, int, float, bool)
+
+_hashes = {}   # (path, size, mtime_ns) -> content hash
+
+
+def enabled():
+    return CACHE_DIR not in ("", "0")
+
+
+def file_hash(path):
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if key not in _hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
+
+
+# === Cell encoding ===
+
+def _encode_timedelta(value):
+    return f"{value.days},{value.seconds},{value.microseconds}"
+
+
+def _decode_timedelta(text):
+    days, seconds, microseconds = (int(part) for part in text.split(","))
+    return datetime.timedelta(days=days, seconds=seconds, microseconds=microseconds)
+
+
+# tag -> (type, encode, decode); datetime before date, it is a subclass
+CELL_TAGS = {
+    "n": (type(None), lambda value: "", lambda text: None),
+    "s": (str, str, str),
+    "b": (bool, lambda value: "1" if value else "0", lambda text: text == "1"),
+    "i": (int, str, int),
+    "f": (float, repr, float),
+    "D": (datetime.datetime, datetime.datetime.isoformat, datetime.datetime.fromisoformat),
+    "d": (datetime.date, datetime.date.isoformat, datetime.date.fromisoformat),
+    "t": (datetime.time, datetime.time.isoformat, datetime.time.fromisoformat),
+    "T": (datetime.timedelta, _encode_timedelta, _decode_timedelta),
+}
+_TAG_OF = {kind: tag for tag, (kind, _, _) in CELL_TAGS.items()}
+
+
+def _tag(value):
+    tag = _TAG_OF.get(type(value))
+    if tag is None:
+        # A subclass openpyxl might hand back; anything else is kept as its text
+        tag = next((tag for tag, (kind, _, _) in CELL_TAGS.items() if isinstance(value, kind)), "s")
+    return tag
+
+
+def encode_column(values):
+    if all(value is None or type(value) in JSON_TYPES for value in values):
+        return list(values)
+    tags = [_tag(value) for value in values]
+    return {
+        "values": [CELL_TAGS[tag][1](value) for tag, value in zip(tags, values)],
+        "tags": "".join(tags),
+    }
+
+
+def decode_column(column):
+    if isinstance(column, list):
+        return column
+    return [CELL_TAGS[tag][2](text) for tag, text in zip(column["tags"], column["values"])]
+
+
+# === Entries ===
+
+def _entry_prefix(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, stem)
+
+
+def _sheet_key(sheet):
+    return re.sub(r"[^\w.-]+", "_", str(sheet)) if sheet is not None else "first"
+
+
+def _entry_path(path, sheet):
+    return f"{_entry_prefix(path)}-{file_hash(path)[:24]}-{_sheet_key(sheet)}.jsonl"
+
+
+def _last_line(f, chunk=4096):
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    tail = b""
+    while end > 0 and tail.count(b"\n") < 2:
+        start = max(0, end - chunk)
+        f.seek(start)
+        tail = f.read(end - start) + tail
+        end = start
+    return tail.rstrip(b"\n").rsplit(b"\n", 1)[-1]
+
+
+class CachedSheet:
+    # A complete cache entry: header and row count are read up front, the
+    # rows a batch at a time by batches()
+    def __init__(self, entry, header, rows):
+        self.entry = entry
+        self.header = header     # cell values of the header row, None for blank header cells
+        self.rows = rows
+
+    def batches(self):
+        # Yields (row count, one list of cell values per header position) per batch
+        with open(self.entry, "rb") as f:
+            next(f)
+            for line in f:
+                batch = json.loads(line)
+                if batch.get("end"):
+                    return
+                yield batch["rows"], [decode_column(column) for column in batch["columns"]]
+
+
+def open_sheet(path, sheet=None):
+    # The cached sheet, or None when it isn't cached (or can't be read)
+    if not enabled():
+        return None
+    entry = _entry_path(path, sheet)
+    if not os.path.exists(entry):
+        return None
+    try:
+        with open(entry, "rb") as f:
+            head = json.loads(f.readline())
+            end = json.loads(_last_line(f))
+        if head.get("version") == FORMAT_VERSION and end.get("end"):
+            return CachedSheet(entry, decode_column(head["header"]), end["rows"])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Ignoring unreadable workbook cache {entry}: {e}")
+    return None
+
+
+def _remove_stale(path, sheet, entry):
+    # Entries of older versions of this workbook (same name and sheet, other hash)
+    prefix = _entry_prefix(path)
+    stale = re.compile(re.escape(os.path.basename(prefix)) + r"-[0-9a-f]{24}-" + re.escape(_sheet_key(sheet))
+                       + r"\.(jsonl|feather|pkl)")
+    for candidate in glob.glob(f"{glob.escape(prefix)}-*"):
+        if stale.fullmatch(os.path.basename(candidate)) and candidate != entry:
+            os.remove(candidate)
+
+
+class SheetWriter:
+    # Writes a sheet to the cache while it is being read: add() each row
+    # (blank rows included, trailing blank rows left out), then close() once
+    # the sheet has been read to the end, or discard() if it wasn't.
+    def __init__(self, path, sheet, header):
+        self.path = path
+        self.sheet = sheet
+        self.width = len(header)
+        self.rows = 0
+        self._batch = []
+        self._file = None
+        if not enabled():
+            return
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            self.entry = _entry_path(path, sheet)
+            self.tmp = f"{self.entry}.{os.getpid()}-{threading.get_ident()}.tmp"
+            self._file = open(self.tmp, "w", encoding="utf-8")
+            self._write({"version": FORMAT_VERSION, "header": encode_column(list(header))})
+        except OSError as e:
+            self._failed(e)
+
+    def _write(self, line):
+        self._file.write(json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def _failed(self, error):
+        print(f"⚠️ Could not write the workbook cache for {self.path}: {error}")
+        self.discard()
+
+    def _flush(self):
+        columns = [[row[position] if position < len(row) else None for row in self._batch]
+                   for position in range(self.width)]
+        self._write({"rows": len(self._batch), "columns": [encode_column(values) for values in columns]})
+        self._batch = []
+
+    def add(self, values):
+        if self._file is None:
+            return
+        self._batch.append(values)
+        self.rows += 1
+        if len(self._batch) >= BATCH_ROWS:
+            try:
+                self._flush()
+            except OSError as e:
+                self._failed(e)
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            if self._batch:
+                self._flush()
+            self._write({"end": True, "rows": self.rows})
+            self._file.close()
+            self._file = None
+            # Atomic, so parallel readers (shards, other scripts) see the old entry or the new one
+            os.replace(self.tmp, self.entry)
+            _remove_stale(self.path, self.sheet, self.entry)
+        except OSError as e:
+            self._failed(e)
+
+    def discard(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
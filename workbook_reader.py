@@ -0,0 +1,181 @@
+import math
+
+from openpyxl import load_workbook
+
+import workbook_cache
+
+# Streaming replacement for pd.read_excel + df.iterrows(): reads the sheet in
+# openpyxl read-only mode and yields one small dict per row holding only the
+# columns the caller asked for, so memory stays flat and the upload can start
+# on the first row.
+#
+# Records mirror what the scripts used to get from pandas: empty cells, and
+# text cells pandas reads as missing by default ('NULL', 'NA', 'N/A', ...;
+# NA_STRINGS), are NaN (so pd.isna / pd.notna / str() behave as before),
+# missing columns are simply absent (row.get(...) -> None), fully blank rows
+# in the middle of the sheet are kept and trailing blank rows are dropped,
+# like pandas does. One difference remains: pandas turns a whole numeric
+# column with gaps into floats (46 -> 46.0), while records keep each cell's
+# own type; the scripts only ever read those columns through float() or a
+# number regex. `python workbook_reader.py <workbook.xlsx> ...` compares the
+# records with pd.read_excel.
+#
+# A sheet is written to workbook_cache while it is read and kept once it
+# has been read to the end; while the file stays the same, later reads
+# stream from there instead of openpyxl. workbook_columns and row_count only
+# read the cache entry's first and last lines.
+
+
+# pandas' default na_values (pandas._libs.parsers.STR_NA_VALUES)
+NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+
+def cell_value(value):
+    # A cell as pandas would have it: NaN for blanks and NA strings
+    if value is None or (isinstance(value, str) and value in NA_STRINGS):
+        return math.nan
+    return value
+
+
+def _open_sheet(path, sheet=None):
+    wb = load_workbook(path, read_only=True, data_only=True)
+    ws = wb[sheet] if sheet is not None else wb.worksheets[0]
+    return wb, ws
+
+
+def workbook_columns(path, sheet=None):
+    cached = workbook_cache.open_sheet(path, sheet)
+    if cached is not None:
+        return [name for name in cached.header if name is not None]
+    wb, ws = _open_sheet(path, sheet)
+    try:
+        header = next(ws.iter_rows(max_row=1, values_only=True), ())
+        return [name for name in header if name is not None]
+    finally:
+        wb.close()
+
+
+def row_count(path, sheet=None):
+    # Data rows (header excluded), or None when that can't be told without
+    # reading the sheet. A cached sheet knows its exact count; otherwise the
+    # sheet's stored dimensions are used when it has them (cheap, but
+    # trailing blank rows count). Counting by reading would decode the sheet
+    # a second time next to the run's own read, which caches it for next time.
+    cached = workbook_cache.open_sheet(path, sheet)
+    if cached is not None:
+        return cached.rows
+    wb, ws = _open_sheet(path, sheet)
+    try:
+        return max(0, ws.max_row - 1) if ws.max_row else None
+    finally:
+        wb.close()
+
+
+def _wanted(header, columns):
+    return [
+        (name, position) for position, name in enumerate(header)
+        if name is not None and (columns is None or name in columns)
+    ]
+
+
+def _iter_cached(cached, columns):
+    wanted = _wanted(cached.header, columns)
+    index = 0
+    for rows, batch in cached.batches():
+        values = [(name, batch[position]) for name, position in wanted]
+        for offset in range(rows):
+            record = {}
+            for name, column in values:
+                record[name] = cell_value(column[offset])
+            yield index, record
+            index += 1
+
+
+def iter_rows(path, columns=None, sheet=None):
+    # Yields (index, record) with index counting data rows from 0, like df.index
+    cached = workbook_cache.open_sheet(path, sheet)
+    if cached is not None:
+        yield from _iter_cached(cached, columns)
+        return
+
+    wb, ws = _open_sheet(path, sheet)
+    writer = None
+    finished = False
+    try:
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        wanted = _wanted(header, columns)
+        writer = workbook_cache.SheetWriter(path, sheet, header)
+
+        index = 0
+        blank_run = []
+        for values in rows:
+            if all(value is None for value in values):
+                blank_run.append(index)
+                index += 1
+                continue
+            # A non-blank row follows, so the blank ones before it are real rows
+            for blank_index in blank_run:
+                writer.add(())
+                yield blank_index, {name: math.nan for name, _ in wanted}
+            blank_run = []
+
+            writer.add(values)
+            record = {}
+            for name, position in wanted:
+                record[name] = cell_value(values[position] if position < len(values) else None)
+            yield index, record
+            index += 1
+        finished = True
+    finally:
+        wb.close()
+        # Only a sheet read to the end is kept
+        if writer is not None:
+            if finished:
+                writer.close()
+            else:
+                writer.discard()
+
+
+# === Parity check against pd.read_excel ===
+
+def _same_cell(ours, theirs):
+    if isinstance(ours, float) and math.isnan(ours):
+        return isinstance(theirs, float) and math.isnan(theirs)
+    if isinstance(ours, (int, float)) and not isinstance(ours, bool) and isinstance(theirs, float):
+        return ours == theirs   # a whole numeric column with gaps is float in pandas
+    return ours == theirs and type(ours) is type(theirs)
+
+
+def check_against_pandas(path, sheet=None):
+    import pandas as pd
+
+    frame = pd.read_excel(path, sheet_name=sheet if sheet is not None else 0)
+    records = [record for _, record in iter_rows(path, sheet=sheet)]
+    mismatches = 0
+    if len(records) != len(frame):
+        print(f"❌ {path}: {len(records)} rows vs {len(frame)} from pandas")
+        mismatches += 1
+    for index, (record, (_, row)) in enumerate(zip(records, frame.iterrows())):
+        for column in frame.columns:
+            if not _same_cell(record.get(column), row[column]):
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"❌ {path} row {index + 1} {column!r}: {record.get(column)!r} vs pandas {row[column]!r}")
+    print(f"{'✅' if not mismatches else '❌'} {path}: {len(records)} rows, {mismatches} mismatches with pd.read_excel")
+    return mismatches
+
+
+if __name__ == "__main__":
+    import sys
+
+    paths = sys.argv[1:] or [
+        'Education.xlsx', 'CSE.xlsx', 'Commerce.xlsx', 'studyreach_unique_courses_filtered_.xlsx',
+        'CombinedUniversities.xlsx',
+    ]
+    sys.exit(1 if sum(check_against_pandas(path) for path in paths) else 0)